@@ -1,10 +1,27 @@
 from client import Client
+from pool import ClientPool
+from backends import create_backend
+import os
 import sys
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print("Error: too few argumetns given!!!")
     else:
-        # app.py [(LOCAL) IP ADDRESS] [PORT] [ID (UNIQUE)]
-        client = Client(sys.argv[1], sys.argv[2], sys.argv[3])
+        # app.py [(LOCAL) IP ADDRESS] [PORT] [ID (UNIQUE)] [BATCH SIZE (OPTIONAL)] [SLOTS (OPTIONAL, NUMBER OR 'auto')]
+        # PSO_BACKEND=surrogate replaces webots by the built-in NumPy simulation (in the arenas of the ArenaArchive PSO_ARENAS, if set), PSO_BACKEND=persistent keeps
+        # a simulator process (the command line PSO_SIMULATOR, stub_simulator.py by default) alive per slot instead of launching webots for every run
+        backend = os.environ.get("PSO_BACKEND", "webots")
+        # PSO_ENCODING=msgpack sends and receives msgpack instead of JSON
+        encoding = os.environ.get("PSO_ENCODING", "json")
+        # PSO_PIPELINE=1 prepares the next run while the current one simulates and submits answers in the background (without batches),
+        # answers that did not reach the server yet are kept in PSO_OUTBOX (a directory, the working directory by default)
+        pipelined = os.environ.get("PSO_PIPELINE") == "1"
+        outbox_dir = os.environ.get("PSO_OUTBOX", ".")
+        batch_size = sys.argv[4] if len(sys.argv) > 4 else 1
+        if len(sys.argv) > 5:
+            slots = None if sys.argv[5] == "auto" else sys.argv[5]
+            client = ClientPool(sys.argv[1], sys.argv[2], sys.argv[3], slots, batch_size, backend, encoding, pipelined, outbox_dir)
+        else:
+            client = Client(sys.argv[1], sys.argv[2], sys.argv[3], batch_size, backend=create_backend(backend), encoding=encoding, pipelined=pipelined, outbox_dir=outbox_dir)
         client.run()
\ No newline at end of file
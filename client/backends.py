@@ -0,0 +1,341 @@
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+from simulator import SimulatorError, SimulatorProcess
+from world_generation.WorldPool import WorldPool
+from world_generation.ArenaGenerator import Arena, ArenaArchive, generate_bitmaps
+
+class FitnessBackend():
+    """ computes the fitness of one run, given the parameters that the server sent """
+
+    def prepare(self, parameters : dict, instance_id : int, shared_arena = True):
+        """ create everything the run needs (world, arena), called before evaluate """
+        return
+
+    def evaluate(self, parameters : dict, instance_id : int):
+        """ returns the fitness value of the run, or None when the run failed or was cancelled """
+        raise NotImplementedError
+
+    def evaluate_batch(self, parameters : list, instance_id : int, prepare = None):
+        """
+        the fitness values of several runs (None for a failed or skipped run). prepare(run) creates everything a run
+        needs instead of self.prepare and returns False to skip the run. By default the runs are prepared and
+        evaluated one by one, a backend that simulates runs side by side overrides this.
+        """
+        if prepare is None:
+            prepare = lambda run: self.prepare(run, instance_id)
+        answers = []
+        for run in parameters:
+            answers.append(None if prepare(run) is False else self.evaluate(run, instance_id))
+        return answers
+
+    def cancel(self, instance_id : int):
+        """ abort the evaluation that is running for instance_id (called from another thread) """
+        return
+
+class WebotsBackend(FitnessBackend):
+    """
+    launches webots for every run, the supervisor writes the fitness to local_fitness_<instance_id>.txt.
+    Worlds come from a WorldPool, so a world is only generated the first time its seed is used.
+    prepare writes everything of a run into the files of instance_id, so the next run of a pipelined
+    client can be prepared in another instance id while this one simulates.
+    """
+    nr_robots = 4
+
+    def __init__(self, webots = "c:/Program Files/Webots/msys64/mingw64/bin/webots.exe", project = "C:/Users/marti/OneDrive/Documenten/IEM/IP/project/demo"):
+        self.webots = webots
+        self.project = project
+        self.processes = {} # instance id -> running webots process
+        self.cancelled = set()
+        self.lock = threading.Lock()
+        self.pools = {} # instance id -> WorldPool
+        self.worlds = {} # instance id -> file name of the world of the next run
+
+    def prepare(self, parameters : dict, instance_id : int, shared_arena = True):
+        pool = self.pools.get(instance_id)
+        if pool is None:
+            pool = self.pools[instance_id] = WorldPool(instance_id, shared_arena, project=self.project)
+        # every particle simulates run i in the world of the seed the server assigned to run i
+        path = pool.activate(parameters.get("seed", instance_id), parameters.get("fill_ratio", 0.48), self.nr_robots)
+        self.worlds[instance_id] = os.path.basename(path)
+
+        # make parameters.json and put them on the right place
+        values = self.controller_values(parameters)
+        with open(self.project + "/controllers/bayesV2/parameters_" + str(instance_id) + ".json", 'w') as para_file:
+            json.dump(values, para_file)
+
+    def controller_values(self, parameters : dict):
+        """ the parameters of the bayesV2 controller """
+        return {
+            "alpha" : 10,
+            "beta": 10,
+            "rw_mean" : parameters["rw_mean"],
+            "rw_variance": parameters["rw_variance"],
+            "tao": parameters["tao"],
+            "u_plus": parameters["u_plus"],
+            "p_c": parameters["p_c"],
+            "report_data" : False,
+            "nr_robots" : self.nr_robots
+        }
+
+    def evaluate(self, parameters : dict, instance_id : int):
+        # the world and parameters.json of the run are in place, see prepare
+        # launch webots
+        with self.lock:
+            self.cancelled.discard(instance_id)
+            process = subprocess.Popen(self.webots + " --mode=fast --no-rendering " + self.project + "/worlds/" + self.worlds[instance_id])
+            self.processes[instance_id] = process
+        process.wait()
+        with self.lock:
+            del self.processes[instance_id]
+            if instance_id in self.cancelled:
+                # another client answered the run first
+                return None
+
+        # return answer of supervisor, otherwise, return an error
+        try:
+            with open(self.project + '/controllers/cpp_supervisor/local_fitness_' + str(instance_id) + '.txt', 'r') as file:
+                fitness_value = file.readline().strip()
+                return float(fitness_value)
+        except FileNotFoundError:
+            print("The file does not exist.")
+
+    def cancel(self, instance_id : int):
+        with self.lock:
+            process = self.processes.get(instance_id)
+            if process is not None:
+                self.cancelled.add(instance_id)
+                process.kill()
+
+class PersistentBackend(WebotsBackend):
+    """
+    Keeps one simulator process per instance alive and hands it runs over its stdin/stdout
+    (see simulator.SimulatorProcess for the protocol) instead of launching webots for every run.
+    The simulator reloads the world of the run itself. When the simulator cannot be started, every
+    run falls back to launching webots; when it crashes or hangs during a run, it is restarted once
+    before that run falls back. Without prepare_worlds (a simulator that builds its own arena, like
+    stub_simulator.py), nothing is written into the webots project and a failed run is not retried in webots.
+    """
+
+    def __init__(self, command, *args, prepare_worlds = True):
+        # the remaining arguments (webots, project) are those of WebotsBackend
+        WebotsBackend.__init__(self, *args)
+        self.command = command
+        self.prepare_worlds = prepare_worlds
+        self.simulators = {} # instance id -> SimulatorProcess
+        self.available = True
+
+    def prepare(self, parameters : dict, instance_id : int, shared_arena = True):
+        if self.prepare_worlds:
+            WebotsBackend.prepare(self, parameters, instance_id, shared_arena)
+
+    def evaluate(self, parameters : dict, instance_id : int):
+        if not self.available:
+            return self.__fall_back(parameters, instance_id)
+
+        request = {
+            "world": self.project + "/worlds/" + self.worlds[instance_id] if self.prepare_worlds else None,
+            "instance_id": instance_id,
+            "seed": parameters.get("seed"),
+            "parameters": self.controller_values(parameters)
+        }
+        with self.lock:
+            self.cancelled.discard(instance_id)
+        for _ in range(2):
+            simulator = self.__get_simulator(instance_id)
+            if simulator is None:
+                break
+            try:
+                return simulator.evaluate(request)
+            except SimulatorError as error:
+                simulator.close()
+                del self.simulators[instance_id]
+                with self.lock:
+                    if instance_id in self.cancelled:
+                        # cancel killed the simulator, the next run starts a new one
+                        return None
+                print("simulator of instance ", instance_id, " failed: ", error)
+        return self.__fall_back(parameters, instance_id)
+
+    def __fall_back(self, parameters, instance_id):
+        if not self.prepare_worlds:
+            # there is no world to launch webots with
+            return None
+        return WebotsBackend.evaluate(self, parameters, instance_id)
+
+    def __get_simulator(self, instance_id):
+        simulator = self.simulators.get(instance_id)
+        if simulator is None:
+            try:
+                simulator = SimulatorProcess(self.command, instance_id)
+            except OSError as error:
+                print("cannot start the simulator, launching webots for every run: ", error)
+                self.available = False
+                return None
+            self.simulators[instance_id] = simulator
+        return simulator
+
+    def cancel(self, instance_id : int):
+        with self.lock:
+            simulator = self.simulators.get(instance_id)
+            if simulator is not None:
+                self.cancelled.add(instance_id)
+                simulator.kill()
+        WebotsBackend.cancel(self, instance_id)
+
+class SurrogateBackend(FitnessBackend):
+    """
+    Pure NumPy stand-in for the webots simulation of the collective decision.
+
+    Robots do a random walk over the arena: straight segments with a duration drawn from
+    N(rw_mean, rw_variance) ms and a random new heading after every segment. Every tao ms a robot
+    observes the colour of the tile below it and broadcasts it to the swarm, every robot keeps a
+    Beta posterior over the fill ratio. A robot decides once P(fill ratio > 0.5) leaves [1 - p_c, p_c];
+    with u_plus, decided robots broadcast their decision instead of their observations.
+
+    The fitness is the mean decision time in seconds, robots that decide wrongly or not at all
+    count as max_time. All runs of evaluate_batch (and simulate) are simulated side by side.
+    With an ArenaArchive, run i is simulated in arena i of the archive instead of an arena drawn from its seed.
+    """
+    nr_robots = 4
+    speed = 0.16 # m/s, the arena is 1 x 1 m
+    dt = 0.5 # s
+    max_time = 400 # s
+
+    def __init__(self, seed = None, archive : ArenaArchive = None):
+        self.rng = np.random.default_rng(seed)
+        self.archive = archive
+
+    def evaluate(self, parameters : dict, instance_id : int):
+        # with the seed of the run, the arena and the robots are the same for every particle
+        rng = np.random.default_rng(parameters["seed"]) if "seed" in parameters else None
+        return self.simulate([parameters], rng=rng)[0]
+
+    def evaluate_batch(self, parameters : list, instance_id : int, prepare = None):
+        # every run is prepared first, the arena of a run comes from its seed but the robots of all runs from one generator
+        selected = [prepare is None or prepare(run) is not False for run in parameters]
+        runs = [run for run, keep in zip(parameters, selected) if keep]
+        answers = iter(self.simulate(runs) if runs else [])
+        return [next(answers) if keep else None for keep in selected]
+
+    def simulate(self, parameters : list, arenas = None, rng = None):
+        """
+        fitness of every parameter dict, arenas is an optional list of (x, y) tile bitmaps of the same shape.
+        The arena of a run comes from its "seed" (see arena), the simulation from rng (or the backend's generator).
+        """
+        rng = self.rng if rng is None else rng
+        n = len(parameters)
+        if arenas is None:
+            arenas = [self.arena(p, rng) for p in parameters]
+        bitmaps = np.asarray(arenas, dtype=np.int8)
+        # tiles along x and y, an arena does not have to be square
+        tiles = np.array(bitmaps.shape[1:])
+        truth = (bitmaps.reshape(n, -1).mean(axis=1) > 0.5)[:, None]
+
+        def column(name):
+            return np.array([float(p[name]) for p in parameters])[:, None]
+        rw_mean = column("rw_mean") / 1000
+        rw_sd = np.sqrt(np.maximum(column("rw_variance"), 0)) / 1000
+        tao = np.maximum(column("tao") / 1000, self.dt)
+        u_plus = column("u_plus") > 0
+        p_c = column("p_c")
+
+        shape = (n, self.nr_robots)
+        rows = np.arange(n)[:, None]
+        pos = rng.uniform(0.05, 0.95, size=shape + (2,))
+        heading = rng.uniform(0, 2 * np.pi, size=shape)
+        segment = self.__draw_segment(rng, rw_mean, rw_sd, shape)
+        next_observation = rng.uniform(0, 1, size=shape) * tao
+        alpha = np.ones(n)
+        beta = np.ones(n)
+        decision = np.full(shape, -1, dtype=np.int8)
+        decision_time = np.full(shape, float(self.max_time))
+
+        t = 0.0
+        while t < self.max_time and (decision < 0).any():
+            t += self.dt
+            # move and bounce off the walls
+            pos[..., 0] += self.speed * self.dt * np.cos(heading)
+            pos[..., 1] += self.speed * self.dt * np.sin(heading)
+            outside = (pos < 0) | (pos > 1)
+            pos = np.where(pos < 0, -pos, np.where(pos > 1, 2 - pos, pos))
+            heading = np.where(outside[..., 0], np.pi - heading, heading)
+            heading = np.where(outside[..., 1], -heading, heading)
+
+            # start a new straight segment
+            segment -= self.dt
+            turn = segment <= 0
+            if turn.any():
+                heading = np.where(turn, rng.uniform(0, 2 * np.pi, size=shape), heading)
+                segment = np.where(turn, self.__draw_segment(rng, rw_mean, rw_sd, shape), segment)
+
+            # observe, robots that decided broadcast their decision with u_plus
+            observing = next_observation <= t
+            if not observing.any():
+                continue
+            next_observation = np.where(observing, next_observation + tao, next_observation)
+            cell = np.minimum((pos * tiles).astype(int), tiles - 1)
+            colour = bitmaps[rows, cell[..., 0], cell[..., 1]]
+            colour = np.where(u_plus & (decision >= 0), decision, colour)
+            alpha += (observing * colour).sum(axis=1)
+            beta += (observing * (1 - colour)).sum(axis=1)
+
+            belief = self.__probability_above_half(alpha, beta)[:, None]
+            decided_now = (decision < 0) & observing & ((belief > p_c) | (belief < 1 - p_c))
+            decision = np.where(decided_now, (belief > 0.5).astype(np.int8), decision)
+            decision_time = np.where(decided_now, t, decision_time)
+
+        correct = decision == truth
+        fitness = np.where(correct, decision_time, float(self.max_time)).mean(axis=1)
+        return [float(value) for value in fitness]
+
+    def arena(self, parameters : dict, rng = None):
+        """ the bitmap of the arena of a run: number seed of the archive (for its fill ratio), or drawn from the seed (or rng) """
+        fill_ratio = parameters.get("fill_ratio", 0.48)
+        if "seed" not in parameters:
+            return self.create_bitmap(fill_ratio, rng=rng)
+        if self.archive is not None and math.isclose(fill_ratio, self.archive.fill_ratio):
+            return np.asarray(self.archive[parameters["seed"] % len(self.archive)])
+        return self.create_bitmap(fill_ratio, rng=np.random.default_rng(parameters["seed"]))
+
+    def create_bitmap(self, fill_ratio, shape = Arena.shape, rng = None):
+        """ the tile map of an Arena as a bitmap, 1 is a white tile """
+        return generate_bitmaps(1, fill_ratio, shape, self.rng if rng is None else rng)[0]
+
+    def __draw_segment(self, rng, rw_mean, rw_sd, shape):
+        return np.maximum(rng.normal(rw_mean, rw_sd, size=shape), self.dt)
+
+    @staticmethod
+    def __probability_above_half(alpha, beta):
+        # normal approximation of the Beta posterior
+        total = alpha + beta
+        mean = alpha / total
+        sd = np.sqrt(alpha * beta / (total * total * (total + 1)))
+        return 0.5 * (1 + _erf((mean - 0.5) / (sd * math.sqrt(2))))
+
+def _erf(x):
+    # Abramowitz and Stegun 7.1.26, accurate to 1.5e-7
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1 / (1 + 0.3275911 * x)
+    y = 1 - (((((1.061405429 * t - 1.453152027) * t) + 1.421413741) * t - 0.284496736) * t + 0.254829592) * t * np.exp(-x * x)
+    return sign * y
+
+def create_backend(name : str):
+    if name == "surrogate":
+        # PSO_ARENAS is an ArenaArchive (.npy) with an arena per run seed
+        if "PSO_ARENAS" in os.environ:
+            return SurrogateBackend(archive=ArenaArchive(os.environ["PSO_ARENAS"]))
+        return SurrogateBackend()
+    if name == "persistent":
+        # PSO_SIMULATOR is the command line of the simulator, which loads the worlds of the webots project
+        if "PSO_SIMULATOR" in os.environ:
+            return PersistentBackend(os.environ["PSO_SIMULATOR"])
+        # a list, so paths with spaces or backslashes are passed as they are
+        return PersistentBackend([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_simulator.py")], prepare_worlds=False)
+    return WebotsBackend()
@@ -1,31 +1,83 @@
 import requests
-import json
 import math
-import subprocess
+import contextlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from random import gauss
-from world_generation.createWorldParallel import WorldGenerator
+from backends import FitnessBackend, WebotsBackend
+from connection import Connection
+from outbox import Outbox
 import numpy as np
 
 class Client():
     # server_url = "http://localhost:5000/"
+    heartbeat_interval = 30 # seconds between asking the server which runs to abort
+    second_namespace = 1000000 # added to the instance id for the files of every other run in pipelined mode
 
-    def __init__(self, ip_address : str, port : str, id: str):
+    def __init__(self, ip_address : str, port : str, id: str, batch_size = 1, instance_id = None, world_lock = None, backend : FitnessBackend = None, encoding = "json", pipelined = False, outbox_dir = "."):
         self.local_id = int(id)
+        # computes the fitness of a run, webots by default
+        self.backend = backend if backend is not None else WebotsBackend()
+        self.batch_size = int(batch_size)
+        # the instance id namespaces the world, parameter and fitness files of this client
+        self.instance_id = self.local_id if instance_id is None else int(instance_id)
+        # in pipelined mode the next run is prepared while the current one simulates, so they need their own arena files
+        self.pipelined = pipelined
+        self.shared_arena = instance_id is None and not pipelined
+        # answers that still have to reach the server in pipelined mode, see outbox.Outbox
+        self.outbox_path = os.path.join(outbox_dir, "outbox_" + str(self.instance_id) + ".jsonl")
+        # world generation seeds the global random generators, so clients in one process take turns
+        self.world_lock = world_lock if world_lock is not None else contextlib.nullcontext()
         self.server_url = "http://" + ip_address + ":" + port + "/"
         self.request_comp_url = self.server_url + "compute"
         self.post_ans_url= self.server_url + "submit"
+        self.request_batch_url = self.server_url + "compute_batch"
+        self.post_batch_url = self.server_url + "submit_batch"
+        self.heartbeat_url = self.server_url + "heartbeat"
+        # keep-alive sessions, the heartbeat thread has its own
+        self.connection = Connection(encoding)
+        self.heartbeat_connection = Connection(encoding, retries = 0)
+        self.encoding = encoding
+        # runs that another client answered first, see __heartbeat_loop. The main, heartbeat and sender threads all change it
+        self.aborted = set()
+        self.abort_lock = threading.Lock()
+        self.stopped = threading.Event()
+        # set whenever the background sender delivered answers, they can open the next generation
+        self.answers_sent = threading.Event()
         self.current_parameters = {}
+        self.current_instance = self.instance_id # the namespace of the files of the current run
         self.particle_id : int
         self.particle_generation : int
         self.run_id : int
         return
     
     def run(self):
+        heartbeat = threading.Thread(target=self.__heartbeat_loop, daemon=True)
+        heartbeat.start()
+        try:
+            if self.pipelined:
+                self.run_pipelined()
+            elif self.batch_size > 1:
+                self.run_batch()
+            else:
+                self.run_single()
+        finally:
+            self.stopped.set()
+            self.connection.close()
+
+    def run_single(self):
         # main loop
         while(True):
             # request to do a computation
             if self.__request_computation() == True:
+                # every open run is leased to another client, come back later
+                if "wait" in self.current_parameters:
+                    time.sleep(self.current_parameters["wait"])
+                    continue
+
                 # get the right settings
                 self.particle_id = self.current_parameters["particle_id"]
                 self.particle_generation = self.current_parameters["generation"]
@@ -37,75 +89,217 @@ class Client():
                 # do a calculation
                 answer = self.__do_calculation()
 
-                # post answer
-                if answer != None:
+                # post answer, unless another client answered the run first
+                if answer != None and not self.__is_aborted(self.current_parameters):
                     self.__post_answer(answer)
             else:
                 break
 
-    def __create_arena(self):
-        wg = WorldGenerator(fill_ratio = 0.48, instance_id=self.local_id)
-        wg.createWorld()
+    def run_batch(self):
+        """ main loop of the batch mode: lease batch_size runs at once and submit all answers at once """
+        while(True):
+            jobs = self.__request_computation_batch()
+            if jobs is None:
+                break
+            # every open run is leased to another client, come back later
+            if "wait" in jobs:
+                time.sleep(jobs["wait"])
+                continue
 
-    def __do_calculation(self):
-        # make parameters.json and put them on the right place
-        values = {
-            "alpha" : 10,
-            "beta": 10,
-            "rw_mean" : self.current_parameters["rw_mean"],
-            "rw_variance": self.current_parameters["rw_variance"],
-            "tao": self.current_parameters["tao"],
-            "u_plus": self.current_parameters["u_plus"],
-            "p_c": self.current_parameters["p_c"],
-            "report_data" : False,
-            "nr_robots" : 4
-        }
-        
-        with open("C:/Users/marti/OneDrive/Documenten/IEM/IP/project/demo/controllers/bayesV2/parameters_" + str(self.local_id) + ".json", 'w') as para_file:
-            json.dump(values, para_file)
+            results = []
+            # the backend can simulate the runs of the batch side by side, see FitnessBackend.evaluate_batch
+            answers = self.backend.evaluate_batch(jobs["runs"], self.instance_id, self.__prepare_run)
+            for job, answer in zip(jobs["runs"], answers):
+                if answer != None and not self.__is_aborted(job):
+                    results.append({
+                        'particle_id' : job["particle_id"],
+                        'generation': job["generation"],
+                        'run_id': job["run_id"],
+                        'answer': answer,
+                        'study_id': job.get("study_id")
+                        })
 
-        # launch webots
-        subprocess.run("c:/Program Files/Webots/msys64/mingw64/bin/webots.exe --mode=fast --no-rendering C:/Users/marti/OneDrive/Documenten/IEM/IP/project/demo/worlds/bayes_pso_0_" + str(self.local_id) + ".wbt")
+            if results:
+                self.__post_answer_batch(results)
 
-        # return answer of supervisor, otherwise, return an error
+    def run_pipelined(self):
+        """
+        main loop of the pipelined mode: while a run simulates, the next run is leased and its world and parameters
+        are prepared in the other namespace of this client, and a background sender submits the answers
+        """
+        sender_connection = Connection(self.encoding)
+        outbox = Outbox(self.outbox_path, lambda results: self.__send_answers(results, sender_connection))
+        namespaces = (self.instance_id, self.instance_id + self.second_namespace)
+        preparer = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "prefetch-" + str(self.instance_id))
         try:
-            with open('C:/Users/marti/OneDrive/Documenten/IEM/IP/project/demo/controllers/cpp_supervisor/local_fitness_' + str(self.local_id) + '.txt', 'r') as file:
-                # Do something with the file, such as reading its content
-                fitness_value = file.readline().strip()
-                return float(fitness_value)
-        except FileNotFoundError:
-            print("The file does not exist.")
+            turn = 0
+            next_job = preparer.submit(self.__prefetch, namespaces[turn])
+            while(True):
+                job = next_job.result()
+                if job is None:
+                    break
+                instance = namespaces[turn]
+                # prepare the next run in the other namespace while this one simulates
+                turn = 1 - turn
+                next_job = preparer.submit(self.__prefetch, namespaces[turn])
+
+                if self.__is_aborted(job):
+                    continue
+                self.current_parameters = job
+                self.current_instance = instance
+                answer = self.backend.evaluate(job, instance)
+                if answer != None and not self.__is_aborted(job):
+                    outbox.put({
+                        'particle_id' : job["particle_id"],
+                        'generation': job["generation"],
+                        'run_id': job["run_id"],
+                        'answer': answer,
+                        'study_id': job.get("study_id")
+                        })
+        finally:
+            preparer.shutdown(wait = False, cancel_futures = True)
+            outbox.close()
+            sender_connection.close()
+
+    def __prefetch(self, instance):
+        """ lease the next run and prepare it in the namespace instance, None when the server has no run anymore """
+        while(True):
+            self.answers_sent.clear()
+            job = self.__request_run()
+            if job is None:
+                return None
+            # every open run is leased, come back later or as soon as an answer (maybe the last of the generation) is in
+            if "wait" in job:
+                self.answers_sent.wait(job["wait"])
+                continue
+            with self.world_lock:
+                self.backend.prepare(job, instance, self.shared_arena)
+            return job
+
+    def __send_answers(self, results, connection):
+        if not self.__post_answer_batch(results, connection):
+            # the outbox keeps the answers and tries again
+            raise ValueError("the server did not confirm " + str(len(results)) + " answers")
+        self.answers_sent.set()
+
+    @staticmethod
+    def __key(run : dict):
+        return (run.get("study_id"), run["particle_id"], run["generation"], run["run_id"])
+
+    def __is_aborted(self, run : dict):
+        key = self.__key(run)
+        with self.abort_lock:
+            if key in self.aborted:
+                self.aborted.discard(key)
+                return True
+        return False
+
+    def __abort(self, runs : list):
+        """ remember the runs to abort and stop the simulation if it is one of them """
+        current = self.current_parameters
+        with self.abort_lock:
+            for run in runs:
+                self.aborted.add(self.__key(run))
+            cancel = "run_id" in current and self.__key(current) in self.aborted
+        if cancel:
+            print("CLIENT: run ", self.__key(current), " was answered by another client, aborting")
+            self.backend.cancel(self.current_instance)
+
+    def __heartbeat_loop(self):
+        while not self.stopped.wait(self.heartbeat_interval):
+            try:
+                response = self.heartbeat_connection.post(self.heartbeat_url, {'client_id': self.instance_id}, timeout = 10)
+                if response.status_code == 200:
+                    self.__abort(self.heartbeat_connection.decode(response).get("abort", []))
+            except (requests.RequestException, ValueError):
+                # the server is busy or gone, try again at the next heartbeat
+                continue
+
+    def __prepare_run(self, job):
+        """ make job the current run and create its arena, False when another client answered it already """
+        if self.__is_aborted(job):
+            return False
+        self.current_parameters = job
+        self.__create_arena()
+
+    def __create_arena(self):
+        with self.world_lock:
+            self.backend.prepare(self.current_parameters, self.instance_id, self.shared_arena)
+
+    def __do_calculation(self):
+        return self.backend.evaluate(self.current_parameters, self.instance_id)
     
     def __post_answer(self, answer):
         # return the dictionary as json to the post url
-        response = requests.post(self.post_ans_url, json = {
+        response = self.connection.post(self.post_ans_url, {
             'particle_id' : self.particle_id, 
             'generation': self.particle_generation, 
             'run_id': self.run_id,
-            'answer': answer
+            'answer': answer,
+            'client_id': self.instance_id,
+            'study_id': self.current_parameters.get("study_id")
             } )
         
         # Check the response
         if response.status_code == 200:
-            print("SERVER: ", response.text)
+            resp = self.connection.decode(response)
+            print("SERVER: answer accepted: ", resp["accepted"])
+            self.__abort(resp.get("abort", []))
             return True
         else:
             print("The server did not give a confirmation about the answer")
             return False
     
+    def __post_answer_batch(self, results, connection = None):
+        connection = connection if connection is not None else self.connection
+        response = connection.post(self.post_batch_url, {'client_id': self.instance_id, 'results': results})
+
+        # Check the response
+        if response.status_code == 200:
+            resp = connection.decode(response)
+            print("SERVER: accepted ", resp["accepted"], " of ", len(results), " answers")
+            self.__abort(resp.get("abort", []))
+            return True
+        else:
+            print("The server did not give a confirmation about the answers: ", response.status_code)
+            return False
+
+    def __request_computation_batch(self):
+        response = self.connection.get(self.request_batch_url, params = {"client_id": self.instance_id, "n": self.batch_size})
+
+        # Check the response
+        if response.status_code == 200:
+            try:
+                jobs = self.connection.decode(response)
+            except:
+                print(response.text)
+                return None
+            return jobs
+        else:
+            print("Error:", response.status_code, response.text)
+            return None
+
     def __request_computation(self):
+        parameters = self.__request_run()
+        if parameters is None:
+            return False
+        self.current_parameters = parameters
+        return True
+
+    def __request_run(self):
+        """ the parameters of a leased run (or a request to wait), None when the server has no run anymore """
         # Send a POST request to the server
-        response = requests.get(self.request_comp_url)
+        response = self.connection.get(self.request_comp_url, params = {"client_id": self.instance_id})
 
         # Check the response
         if response.status_code == 200:
             try:
-                self.current_parameters = response.json()
-                print("Computation result:", self.current_parameters)
+                parameters = self.connection.decode(response)
+                print("Computation result:", parameters)
             except:
                 print(response.text)
-                return False
-            return True
+                return None
+            return parameters
         else:
             print("Error:", response.status_code, response.text)
-            return False
+            return None
@@ -0,0 +1,55 @@
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import msgpack
+except ImportError:
+    # msgpack is optional, without it everything is JSON
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+class Connection():
+    """
+    Keep-alive session to the server: connections are pooled and reused, failed connections and
+    502/503/504 responses are retried with exponential backoff. Messages are JSON, or msgpack
+    when encoding is "msgpack" (the server answers in msgpack when it can, see the Accept header).
+    """
+
+    def __init__(self, encoding = "json", retries = 5, backoff = 0.5, pool_size = 4, timeout = 60):
+        if encoding == "msgpack" and msgpack is None:
+            print("msgpack is not installed, falling back to JSON")
+            encoding = "json"
+        self.encoding = encoding
+        self.timeout = timeout
+        self.session = requests.Session()
+        # answers are idempotent on the server (a second answer of a run is rejected), so POST is retried as well
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET", "POST"]))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if self.encoding == "msgpack":
+            self.session.headers["Accept"] = MSGPACK + ", " + JSON + ";q=0.9"
+
+    def get(self, url, params = None):
+        return self.session.get(url, params = params, timeout = self.timeout)
+
+    def post(self, url, message, timeout = None):
+        if self.encoding == "msgpack":
+            return self.session.post(url, data = msgpack.packb(message), headers = {"Content-Type": MSGPACK}, timeout = timeout or self.timeout)
+        return self.session.post(url, json = message, timeout = timeout or self.timeout)
+
+    @staticmethod
+    def decode(response):
+        """ the message of a response, raises ValueError when the server answered with plain text """
+        content_type = response.headers.get("Content-Type", "")
+        if content_type.startswith(MSGPACK):
+            return msgpack.unpackb(response.content)
+        return json.loads(response.text)
+
+    def close(self):
+        self.session.close()
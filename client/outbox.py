@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+
+class Outbox():
+    """
+    Durable queue of answers that a background thread submits to the server.
+
+    An answer is appended to a JSON lines file before put returns and the file is rewritten with the
+    answers that are still pending after every delivery, so answers survive a network outage and a
+    restart of the client: the pending answers of a previous run are sent first. A failed delivery is
+    retried with exponential backoff; the server rejects a second answer of a run, so sending twice is harmless.
+    """
+    max_batch = 64 # answers per submission
+    backoff = 1 # seconds before the first retry, doubled up to max_backoff
+    max_backoff = 60
+
+    def __init__(self, path : str, send):
+        self.path = path
+        # delivers a list of answers, raises OSError (requests.RequestException) or ValueError when it could not
+        self.send = send
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.pending = self.__load()
+        if self.pending:
+            print("OUTBOX: resending ", len(self.pending), " answers of a previous run")
+        self.file = open(self.path, 'a')
+        self.closing = False
+        self.closed = False
+        self.sender = threading.Thread(target=self.__send_loop, name="outbox", daemon=True)
+        self.sender.start()
+
+    def __load(self):
+        if not os.path.exists(self.path):
+            return []
+        answers = []
+        with open(self.path, 'r') as file:
+            for line in file:
+                # a torn last line of a crash is skipped
+                if not line.endswith("\n"):
+                    break
+                answers.append(json.loads(line))
+        return answers
+
+    def put(self, answer : dict):
+        with self.lock:
+            self.file.write(json.dumps(answer) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending.append(answer)
+            self.changed.notify()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def __send_loop(self):
+        delay = self.backoff
+        while True:
+            with self.lock:
+                while not self.pending and not self.closing:
+                    self.changed.wait()
+                if self.closed or not self.pending:
+                    return
+                batch = self.pending[:self.max_batch]
+
+            try:
+                self.send(batch)
+            except (OSError, ValueError) as error:
+                print("OUTBOX: cannot submit ", len(batch), " answers, retrying in ", delay, " s: ", error)
+                with self.lock:
+                    self.changed.wait(delay)
+                delay = min(self.max_backoff, delay * 2)
+                continue
+
+            delay = self.backoff
+            with self.lock:
+                del self.pending[:len(batch)]
+                if not self.closed:
+                    self.__rewrite()
+
+    def __rewrite(self):
+        # write to a temporary file first, so a crash never loses the pending answers
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            for answer in self.pending:
+                file.write(json.dumps(answer) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        # the file has to be closed before it can be replaced on windows
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'a')
+
+    def close(self, timeout = 30):
+        """ wait up to timeout seconds for the pending answers, the rest is sent at the next start """
+        with self.lock:
+            self.closing = True
+            self.changed.notify()
+        self.sender.join(timeout)
+        with self.lock:
+            self.closed = True
+            self.file.close()
+            if self.pending:
+                print("OUTBOX: ", len(self.pending), " answers are kept in ", self.path, " for the next start")
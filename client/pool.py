@@ -0,0 +1,32 @@
+import os
+import threading
+
+from client import Client
+from backends import create_backend
+
+class ClientPool():
+    """
+    Runs K simulation slots in one client process. Every slot is a Client with its own
+    instance id (local_id * max_slots + slot), so the world, parameter and fitness files never clash.
+    """
+    max_slots = 100
+    cores_per_simulation = 2 # webots uses about one core for physics and one for the controllers
+
+    def __init__(self, ip_address : str, port : str, id: str, slots = None, batch_size = 1, backend = "webots", encoding = "json", pipelined = False, outbox_dir = "."):
+        if slots is None:
+            slots = self.detect_slots()
+        self.slots = max(1, min(int(slots), self.max_slots))
+        world_lock = threading.Lock()
+        self.clients = [Client(ip_address, port, id, batch_size, instance_id=int(id) * self.max_slots + slot, world_lock=world_lock, backend=create_backend(backend), encoding=encoding, pipelined=pipelined, outbox_dir=outbox_dir) for slot in range(self.slots)]
+
+    @classmethod
+    def detect_slots(cls):
+        return max(1, (os.cpu_count() or 1) // cls.cores_per_simulation)
+
+    def run(self):
+        print("running ", self.slots, " simulation slots")
+        threads = [threading.Thread(target=client.run, name="slot-" + str(client.instance_id)) for client in self.clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
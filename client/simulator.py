@@ -0,0 +1,78 @@
+import json
+import queue
+import shlex
+import subprocess
+import threading
+
+class SimulatorError(Exception):
+    """ the simulator died or did not answer according to the protocol """
+
+class SimulatorProcess():
+    """
+    A long-lived simulator process that evaluates one run at a time.
+
+    The protocol is one JSON object per line. The client writes
+        {"world": path, "instance_id": id, "seed": seed, "parameters": {...controller values...}}
+    to the stdin of the simulator, the simulator (re)loads the world when it differs from the
+    loaded one, runs it and writes {"fitness": value} (or {"error": message}) to its stdout.
+    On {"command": "quit"} or end of input the simulator exits.
+    A simulator that does not answer within timeout seconds is killed.
+    """
+    timeout = 600 # seconds per run
+
+    def __init__(self, command, instance_id = 0, timeout = None):
+        """ command is a list of arguments, or a string that is split like a shell command line """
+        self.instance_id = instance_id
+        if timeout is not None:
+            self.timeout = timeout
+        arguments = shlex.split(command) if isinstance(command, str) else list(command)
+        self.process = subprocess.Popen(arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        # readline cannot time out, so a thread reads the answers into a queue
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self.__read, name="simulator-" + str(instance_id), daemon=True)
+        self.reader.start()
+
+    def __read(self):
+        try:
+            for line in self.process.stdout:
+                self.lines.put(line)
+        except (OSError, ValueError):
+            pass
+        # end of output, the simulator exited or was killed
+        self.lines.put("")
+
+    def evaluate(self, request : dict):
+        """ returns the fitness of the run, None when the simulator reports that the run failed """
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as error:
+            raise SimulatorError(str(error))
+        try:
+            line = self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            self.kill()
+            raise SimulatorError("no answer within " + str(self.timeout) + " s")
+        if not line:
+            raise SimulatorError("the simulator exited with code " + str(self.process.poll()))
+        try:
+            answer = json.loads(line)
+        except ValueError:
+            raise SimulatorError("invalid answer: " + line.strip())
+        if "error" in answer:
+            print("simulator: ", answer["error"])
+            return None
+        return float(answer["fitness"])
+
+    def kill(self):
+        self.process.kill()
+
+    def close(self):
+        """ ask the simulator to quit, kill it when it does not """
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write(json.dumps({"command": "quit"}) + "\n")
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                self.process.kill()
@@ -0,0 +1,31 @@
+import json
+import sys
+
+from backends import SurrogateBackend
+
+# Stand-in for a persistent webots process (see simulator.SimulatorProcess for the protocol):
+# every run is evaluated by the NumPy surrogate in the arena of the seed of the run.
+#   python stub_simulator.py
+
+def main():
+    backend = SurrogateBackend()
+    world = None
+    for line in sys.stdin:
+        request = json.loads(line)
+        if request.get("command") == "quit":
+            break
+        if request["world"] != world:
+            # a real simulator reloads the world here
+            world = request["world"]
+        parameters = dict(request["parameters"])
+        if request.get("seed") is not None:
+            parameters["seed"] = request["seed"]
+        try:
+            answer = {"fitness": backend.evaluate(parameters, request.get("instance_id", 0))}
+        except (KeyError, ValueError) as error:
+            answer = {"error": str(error)}
+        sys.stdout.write(json.dumps(answer) + "\n")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
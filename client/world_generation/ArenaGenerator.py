@@ -3,55 +3,57 @@
 # Description: this script creates an environment for the DTPA lab setup by 
 #               -generating the map with black and white tiles as a .txt file
 #               -generating the image that corresponds to the map as a .png file
-#               Given that there are 5x5 tiles  
+#               Given that there are 5x5 tiles (or any other number of tiles, see Arena.shape)
 # Author: Martijn Schippers
 
 # fill_ratio = 0.52
 
-from PIL import Image, ImageDraw 
+from PIL import Image
 import numpy as np
+import os
 import random
 
 # Create and possibly save the map that represents the black and white tiles 
 # in a .txt file. 
 
 class Arena:
-    nr_tiles = 25 #hardcoded value and intended 
+    nr_tiles = 25 # tiles of the default 5 x 5 arena
+    shape = (5, 5)
     
-    def __init__(self, fill_ratio, tiles = None):
+    def __init__(self, fill_ratio, tiles = None, shape = None, rng = None):
         # self.fill_array = np.array([[0,1,1,1,1],
         #                             [0,1,1,1,1],
         #                             [0,1,1,1,1],
         #                             [0,1,1,1,1],
         #                             [0,1,1,1,1]])
         self.fill_ratio = fill_ratio
+        if tiles is not None:
+            shape = np.shape(tiles)[::-1]
+        if shape is not None:
+            self.shape = tuple(shape)
+            self.nr_tiles = self.shape[0] * self.shape[1]
         if tiles is None:
-            self.map = self.__create()
+            self.map = self.__create(rng)
         else:
             self.map = self.__create_map_from_2D(tiles)
 
     # Create the map as tuples (x, y) in a numpy array
-    def __create(self):
-        # empty map 
-        map = np.zeros((int(self.nr_tiles*self.fill_ratio),2), dtype=int)
-
-        # create random unique numbers between 0 and 100, and use them as 
-        # indexes for colored tiles
-        random_numbers =  random.sample(range(0, self.nr_tiles), int(self.nr_tiles * self.fill_ratio) )
-        
-        # update the map with the random generated numbers
-        for idx, number in enumerate(random_numbers):
-            map[idx][0] = int(number / 5) # x coordinate
-            map[idx][1] = int(number % 5) # y coordinate
-        return map
+    def __create(self, rng = None):
+        # random unique tile numbers, used as indexes for colored tiles
+        amount = nr_filled_tiles(self.nr_tiles, self.fill_ratio)
+        if rng is None:
+            numbers = np.array(random.sample(range(0, self.nr_tiles), amount), dtype=int)
+        else:
+            numbers = rng.choice(self.nr_tiles, size=amount, replace=False)
+        return np.column_stack((numbers // self.shape[1], numbers % self.shape[1])).astype(int)
 
     def __create_map_from_2D(self, tiles):
-        map_list = []
-        for x, row in enumerate(tiles):
-            for y, value in enumerate(row):
-                if value == 1:
-                    map_list.append((y, x))
-        return  np.array(map_list)
+        # (y, x) of every 1 in the rows of tiles
+        return np.argwhere(np.asarray(tiles) == 1)[:, ::-1]
+
+    def bitmap(self):
+        """ the map as a (x, y) array, 1 is a colored tile """
+        return coordinates_to_bitmap(self.map, self.shape)
     
     # save the map (to a .txt file) 
     def save(self, filename = "../controllers/bayesV2/world.txt"):
@@ -61,26 +63,96 @@ class Arena:
 
 class ImageGenerator:
     pic_dim = 500
-    tile_size = pic_dim / 5
 
-    def __init__(self, map: np.ndarray):
+    def __init__(self, map: np.ndarray, shape = Arena.shape):
         self.map = map
-        self.img = Image.new('1', (self.pic_dim, self.pic_dim))
-        self.draw = ImageDraw.Draw(self.img)
-        self.__generate()
-
-    def __generate(self):
-        # fill the image with white tiles for each tile in the map
-        for tile in self.map:
-            x = tile[0] * self.tile_size
-            y = tile[1] * self.tile_size
-            self.draw.rectangle((x, y, x + self.tile_size,y + self.tile_size), fill=1)
-        return
-    
+        self.img = bitmap_to_image(coordinates_to_bitmap(map, shape), self.pic_dim)
+
     def save(self, filename = "world.png"):
         self.img.save(filename)
         return
-    
+
+
+def nr_filled_tiles(nr_tiles, fill_ratio):
+    # round, so a fill ratio like 0.29 of 100 tiles gives 29 and not 28 tiles
+    return int(round(nr_tiles * fill_ratio))
+
+def coordinates_to_bitmap(map, shape = Arena.shape):
+    bitmap = np.zeros(shape, dtype=np.int8)
+    map = np.asarray(map, dtype=int).reshape(-1, 2)
+    bitmap[map[:, 0], map[:, 1]] = 1
+    return bitmap
+
+def bitmap_to_image(bitmap, pic_dim = ImageGenerator.pic_dim):
+    """ texture of a (x, y) bitmap: every tile is upscaled to a square block of pixels, white is 1 """
+    tile_size = max(1, pic_dim // max(bitmap.shape))
+    # image rows are y and columns are x
+    pixels = np.kron(np.asarray(bitmap, dtype=np.uint8).T, np.ones((tile_size, tile_size), dtype=np.uint8))
+    return Image.fromarray(pixels * 255, 'L').convert('1')
+
+def generate_bitmaps(count, fill_ratio, shape = Arena.shape, rng = None):
+    """
+    count arenas as a (count, x, y) int8 array in one go, every arena has exactly
+    nr_filled_tiles colored tiles at uniformly random positions.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    nr_tiles = shape[0] * shape[1]
+    amount = nr_filled_tiles(nr_tiles, fill_ratio)
+    bitmaps = np.zeros((count, nr_tiles), dtype=np.int8)
+    if amount > 0:
+        # the amount smallest of a row of random keys are the colored tiles
+        keys = rng.random((count, nr_tiles))
+        kth = np.partition(keys, amount - 1, axis=1)[:, amount - 1:amount]
+        bitmaps[keys <= kth] = 1
+    return bitmaps.reshape((count,) + tuple(shape))
+
+class ArenaArchive:
+    """
+    Many arenas of one fill ratio and shape in a single .npy file that is memory-mapped,
+    so pools of thousands of arenas never have to fit in memory. The fill ratio and seed
+    are stored next to it in a small .npz file.
+    """
+    chunk_size = 4096 # arenas generated per call of generate_bitmaps
+
+    def __init__(self, path):
+        self.path = path
+        self.bitmaps = np.load(path, mmap_mode='r')
+        with np.load(self.__metadata_path(path)) as metadata:
+            self.fill_ratio = float(metadata["fill_ratio"])
+            self.seed = int(metadata["seed"])
+
+    @classmethod
+    def create(cls, path, count, fill_ratio, shape = Arena.shape, seed = 0):
+        """ write count arenas to path (.npy) chunk by chunk and open the archive """
+        rng = np.random.default_rng(seed)
+        bitmaps = np.lib.format.open_memmap(path, mode='w+', dtype=np.int8, shape=(count,) + tuple(shape))
+        for start in range(0, count, cls.chunk_size):
+            end = min(count, start + cls.chunk_size)
+            bitmaps[start:end] = generate_bitmaps(end - start, fill_ratio, shape, rng)
+        bitmaps.flush()
+        del bitmaps
+        np.savez(cls.__metadata_path(path), fill_ratio=fill_ratio, seed=seed)
+        return cls(path)
+
+    @staticmethod
+    def __metadata_path(path):
+        return os.path.splitext(path)[0] + "_metadata.npz"
+
+    def __len__(self):
+        return len(self.bitmaps)
+
+    def __getitem__(self, index):
+        return self.bitmaps[index]
+
+    def arena(self, index):
+        """ arena number index as an Arena, with the coordinate map that the controllers read """
+        bitmap = np.asarray(self.bitmaps[index % len(self.bitmaps)])
+        return Arena(self.fill_ratio, tiles=bitmap.T)
+
+    def image(self, index):
+        return bitmap_to_image(self.bitmaps[index % len(self.bitmaps)])
+
 # # Convert custom maps via:
 # tiles = np.array( [[1,0,1,1,0],
 #                     [0,1,0,0,1],
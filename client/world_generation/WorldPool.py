@@ -0,0 +1,70 @@
+import os
+import shutil
+
+from world_generation.createWorldParallel import WorldGenerator
+
+class WorldPool():
+    """
+    Worlds that are generated once and reused by reference.
+
+    A pooled world is keyed by (seed, fill_ratio, robot_number): its .wbt, arena map and texture
+    are written the first time the key is asked for (or by pregenerate) and are reused by every
+    later run, also after a restart. The controllers of an instance read the arena map from
+    world(_<instance_id>).txt, so activating a world only copies its small map file, and only
+    when the instance switches to another world.
+    """
+
+    def __init__(self, instance_id=0, shared_arena=True, project=WorldGenerator.project):
+        self.instance_id = instance_id
+        self.shared_arena = shared_arena
+        self.project = project
+        self.worlds = {} # key -> world path
+        self.active = None # the key of the arena map that is in place for this instance
+
+    def key(self, seed, fill_ratio, robot_number):
+        return (int(seed), round(float(fill_ratio), 6), int(robot_number))
+
+    def arenaName(self, key):
+        seed, fill_ratio, robot_number = key
+        return "pool_" + str(seed) + "_" + format(fill_ratio, "g") + "_" + str(robot_number)
+
+    def worldName(self, key):
+        seed, fill_ratio, robot_number = key
+        # the controller arguments of the world contain the instance id
+        return "bayes_pool_" + str(seed) + "_" + format(fill_ratio, "g") + "_" + str(robot_number) + "_" + str(self.instance_id) + ".wbt"
+
+    def get(self, seed, fill_ratio=0.48, robot_number=4):
+        """ the path of the pooled world, generated when it does not exist yet """
+        key = self.key(seed, fill_ratio, robot_number)
+        path = self.worlds.get(key)
+        if path is None:
+            path = self.project + "/worlds/" + self.worldName(key)
+            if not (os.path.exists(path) and os.path.exists(self.__arenaPath(key))):
+                generator = WorldGenerator(instance_id=self.instance_id, fill_ratio=key[1], robot_number=key[2], seed=key[0], arena_name=self.arenaName(key))
+                generator.project = self.project
+                generator.createWorld(path)
+            self.worlds[key] = path
+        return path
+
+    def pregenerate(self, seeds, fill_ratios=(0.48,), robot_number=4):
+        """ generate every combination up front, so no run has to wait for its world """
+        for fill_ratio in fill_ratios:
+            for seed in seeds:
+                self.get(seed, fill_ratio, robot_number)
+
+    def activate(self, seed, fill_ratio=0.48, robot_number=4):
+        """ make the pooled world the world of this instance, returns the path of its .wbt """
+        path = self.get(seed, fill_ratio, robot_number)
+        key = self.key(seed, fill_ratio, robot_number)
+        if key != self.active:
+            shutil.copyfile(self.__arenaPath(key), self.project + "/controllers/bayesV2/" + self.__instanceArenaName() + ".txt")
+            self.active = key
+        return path
+
+    def __arenaPath(self, key):
+        return self.project + "/controllers/bayesV2/" + self.arenaName(key) + ".txt"
+
+    def __instanceArenaName(self):
+        if self.shared_arena:
+            return "world"
+        return "world_" + str(self.instance_id)
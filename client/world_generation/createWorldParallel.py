@@ -3,8 +3,8 @@
 # "Decentralized Collective Decision-Making Algorithms in Simulated Soft-Bodied Robot Swarms for 3D Surface Inspection in Space"
 
 import math
-import numpy as np
 import random 
+from string import Template
 from world_generation.ArenaGenerator import Arena, ImageGenerator
 
 class WorldGenerator():
@@ -15,11 +15,13 @@ class WorldGenerator():
         - particle_id
         - instance_id
         - robot_number
+        - seed (the instance_id by default)
     Output:
         - A single .wbt file that is specific to the given seed.
     """
+    project = "../../project/demo"
 
-    def __init__(self, baseline=0, particle_id=0, instance_id=0, fill_ratio= 0.48, robot_number=4, path=None, dynamic_env=0, env_upper=0.55, env_lower=0.45):
+    def __init__(self, baseline=0, particle_id=0, instance_id=0, fill_ratio= 0.48, robot_number=4, path=None, dynamic_env=0, env_upper=0.55, env_lower=0.45, shared_arena=True, seed=None, arena_name=None, arena_shape=Arena.shape):
         self.baseline = baseline
         self.particle_id = particle_id
         self.instance_id = instance_id
@@ -29,6 +31,13 @@ class WorldGenerator():
         self.dynamic_env = dynamic_env
         self.env_upper = env_upper
         self.env_lower = env_lower
+        # when several instances run next to each other, each instance gets its own world_<instance_id>.txt/.png
+        self.shared_arena = shared_arena
+        self.seed = instance_id if seed is None else seed
+        # a pooled world refers to its own arena instead of the arena of the instance
+        self.arena_name = arena_name
+        # number of tiles along x and y
+        self.arena_shape = tuple(arena_shape)
 
         #This will store the intial positions of the robots.
         self.initialX = [] 
@@ -44,12 +53,19 @@ class WorldGenerator():
     
       return 1
 
+    def arenaName(self):
+      if self.arena_name is not None:
+        return self.arena_name
+      if self.shared_arena:
+        return "world"
+      return "world_" + str(self.instance_id)
+
     def createArena(self):
       #Do not use dynamic environment
-      arena = Arena(self.fill_ratio)
-      arena.save("../../project/demo/controllers/bayesV2/world.txt")
-      img = ImageGenerator(arena.map)
-      img.save("../../project/demo/world_generation/world.png")
+      arena = Arena(self.fill_ratio, shape=self.arena_shape)
+      arena.save(self.project + "/controllers/bayesV2/" + self.arenaName() + ".txt")
+      img = ImageGenerator(arena.map, arena.shape)
+      img.save(self.project + "/world_generation/" + self.arenaName() + ".png")
 
 
     def createPos(self):
@@ -76,14 +92,49 @@ class WorldGenerator():
 
         return title
 
-    def createHeader(self, file):
-        file.write("""#VRML_SIM R2021b utf8
+    def renderRobots(self):
+        arg = "\"" + str(self.instance_id) + "\""
+        robots = [SUPERVISOR_TEMPLATE.substitute(arg=arg, baseline=BASELINE_ARG.format(self.baseline))]
+        for i in range(self.robot_number):
+            orientation = self.orientation[random.randint(0, 3)]
+            robots.append(ROBOT_TEMPLATE.substitute(
+                number=i,
+                x=self.initialX[i],
+                y=self.initialY[i],
+                rotation=" ".join(str(value) for value in orientation),
+                arg=arg,
+                dynamic_env=BASELINE_ARG.format(self.dynamic_env)))
+        return "".join(robots)
+
+    def renderWorld(self):
+        """ the complete .wbt file, the robots are placed with the current random state """
+        self.createPos()
+        return WORLD_TEMPLATE.substitute(arena=self.arenaName(), robots=self.renderRobots())
+
+    def createWorld(self, path=None):
+        """ writes the world and its arena, everything is drawn from the seed """
+        random.seed(self.seed)
+
+        if path is None:
+            path = self.project + "/worlds" + self.createTitle() + ".wbt"
+        #file = open(r"/usr/local/efs/demo/worlds" + self.createTitle() + ".wbt", 'w')
+        #file = open(r"/home/darren/Documents/ICRA_LAUNCH/Rovables_Bayesian_Inspection_Optimization/demo/worlds" + self.createTitle() + ".wbt", 'w')
+        world = self.renderWorld()
+        with open(path, 'w') as file:
+            file.write(world)
 
-# Author: Johannes Boghaert, Darren Chiu\n""")
+        print("World Written with Seed: " + str(self.seed))
+
+        self.createArena()
+        return path
+
+# the world is rendered from precompiled templates in a single write
+BASELINE_ARG = "\"{}\""
+
+WORLD_TEMPLATE = Template("""#VRML_SIM R2021b utf8
+
+# Author: Johannes Boghaert, Darren Chiu
 
-    def createEnv(self, file):
-        file.write(
-        """
 WorldInfo {
   CFM 0.1
   ERP 0.1
@@ -111,7 +162,7 @@ DEF surface Solid {
       appearance Appearance {
         texture ImageTexture {
           url [
-              "../world_generation/world.png"
+              "../world_generation/${arena}.png"
           ]
         }
       }
@@ -143,36 +194,28 @@ Wall {
   rotation 0 1 0 1.5708
   name "wall(3)"
   size 1 0.05 0.025
-}\n""")
-    
-    def createRobots(self, file):
-        arg = "\"" + str(self.instance_id) + "\""
-        arg2 = "\"" + str(self.dynamic_env) + "\""
-        baselineArg = "\"" + str(self.baseline) + "\""
-        file.write(
-        """Robot {
+}
+${robots}""")
+
+SUPERVISOR_TEMPLATE = Template("""Robot {
   name "Bayes Bot Supervisor"
   controller "cpp_supervisor"
   controllerArgs [
-    """ + arg + """
-    """ + baselineArg + """
+    ${arg}
+    ${baseline}
   ]
   supervisor TRUE
-}\n""")
+}
+""")
 
-        for i in range(self.robot_number):
-            index = np.random.randint(0, 4)
-            rotationArg = str(self.orientation[index][0]) + " " + str(self.orientation[index][1]) + " " + str(self.orientation[index][2]) + " " + str(self.orientation[index][3]) 
-            rov_number = str(i)
-            file.write(
-            """DEF r""" + rov_number + """ RovableV2 {
-  translation """ + str(self.initialX[i]) + """ 0.023 """ + str(self.initialY[i]) + """
-  rotation """ + rotationArg + """
-  name "r""" + rov_number + """"
+ROBOT_TEMPLATE = Template("""DEF r${number} RovableV2 {
+  translation ${x} 0.023 ${y}
+  rotation ${rotation}
+  name "r${number}"
   controller "bayesV2"
   controllerArgs [
-    """ + arg + """
-    """ + arg2 + """
+    ${arg}
+    ${dynamic_env}
   ]
   supervisor TRUE
   customData "0.500000-"
@@ -182,27 +225,5 @@ Wall {
     Emitter {
     }
   ]
-}\n""")
-
-    def createWorld(self):
-        random.seed(self.instance_id) 
-
-        file = open(r"../../project/demo/worlds" + self.createTitle() + ".wbt", 'w')
-        #file = open(r"/usr/local/efs/demo/worlds" + self.createTitle() + ".wbt", 'w')
-        #file = open(r"/home/darren/Documents/ICRA_LAUNCH/Rovables_Bayesian_Inspection_Optimization/demo/worlds" + self.createTitle() + ".wbt", 'w')
-        #Start with Header
-        self.createHeader(file)
-
-        #Create the bounding box 
-        self.createEnv(file)
-
-        self.createPos()
-
-        #Creates the number of Rovables in a randomized position
-        self.createRobots(file)
-
-        print("World Written with Seed: " + str(self.instance_id))
-
-        file.close()
-
-        self.createArena()
\ No newline at end of file
+}
+""")
@@ -1,70 +1,423 @@
 import numpy as np
-from particle import Particle, Position, State
-import random
+from particle import Particle, Position
+from optimizer import Optimizer, create_optimizer
+from swarm import DEFAULT_SPACE
+from dispatcher import Dispatcher
+from racing import RacingPolicy
+from cache import ResultCache
+from straggler import DurationTracker
+from prescreening import Prescreening
+import pairing
+import time
+from enum import Enum
+from log import get_logger
+import metrics
+
+logger = get_logger("pso")
+
+# the answer to a request for runs once the study is completed
+COMPLETED = "PSO completed! Please, don't request anymore"
+
+class Mode(Enum):
+    SYNC = 1 # all particles move to the next generation together
+    ASYNC = 2 # each particle moves on as soon as its own runs are solved
 
 class PSO:
+    """
+    Run dispatch of a study: leases the runs of every particle to clients, collects their answers and asks the
+    optimizer (see optimizer.Optimizer, a particle swarm by default) for the next positions of completed particles.
+    """
     nr_particles = 5
     generation_nr = 0
     max_generations = 10
+    fill_ratio = 0.48
+    lease_duration = 600 # seconds before a leased run is handed out again
+    retry_after = 5 # seconds a client should wait when all open runs are leased
+    snapshot_every = 1000 # accepted answers between two snapshots of the journal
+    seed = 0 # world seed of run 0, run i is simulated in world seed + i by every particle
     particles : np.array
+    optimizer : Optimizer
     g_best_pos : dict
     g_best_value : float
 
-    def __init__(self):
-        ran_nr = max(min(1.3, random.random() * 2), 0.7)
-        self.particles = [Particle(i, ran_nr * 4000, ran_nr * 2000, ran_nr * 1500, 0, 0.95, 0.48) for i in range(self.nr_particles)]
+    def __init__(self, mode = Mode.SYNC, racing : RacingPolicy = None, cache : ResultCache = None, nr_particles = None, max_generations = None, fill_ratio = None, seed = None, prescreening : Prescreening = None, optimizer = "pso",
+                 lease_duration = None, retry_after = None):
+        # every study can override the class defaults
+        if lease_duration is not None:
+            self.lease_duration = lease_duration
+        if retry_after is not None:
+            self.retry_after = retry_after
+        if nr_particles is not None:
+            self.nr_particles = nr_particles
+        if max_generations is not None:
+            self.max_generations = max_generations
+        if fill_ratio is not None:
+            self.fill_ratio = fill_ratio
+        if seed is not None:
+            self.seed = seed
+        self.mode = mode
+        # answers of runs with (nearly) the same position and seed are reused instead of simulated again
+        self.cache = cache
+        # adaptive number of runs per particle, None evaluates every particle exactly nr_runs times
+        self.racing = racing
+        # surrogate model that gives unpromising positions fewer runs, None evaluates every position fully
+        self.prescreening = prescreening
+        # the algorithm that moves the particles, by name: "pso", "cmaes" or "de"
+        self.optimizer = self.__create_optimizer(optimizer, self.nr_particles)
+        self.particles = [Particle(i, position) for i, position in enumerate(self.optimizer.get_positions())]
         self.g_best_pos  = self.particles[0].pos.get_position_dict()
         self.g_best_value = float('inf')
+        self.g_best_answers = {} # answers of the global best by run id
+        self.dispatcher = Dispatcher(self.lease_duration)
+        self.nr_solved_particles = 0
+        # generation of each particle, these only differ in asynchronous mode
+        self.generations = [0 for _ in self.particles]
+        for particle in self.particles:
+            self.__queue_runs(particle)
+
+        self.generation_started = time.time()
+        # observed run durations, decides when a leased run is a straggler
+        self.durations = DurationTracker()
+
+        # every accepted answer, see results.ResultStore
+        self.results = None
+
+        # the id of the study this PSO runs, set by study.Study, labels the metrics
+        self.study_id = "default"
+
+        # island mode: exchange of global bests with other shards, see island.MigrationChannel
+        self.migration = None
+
+        # write-ahead journal, see journal.recover
+        self.journal = None
+        self.nr_records = 0
 
     def __print_result_PSO(self):
-        print("global best values: ", self.g_best_pos, " best value: ", self.g_best_value)
+        logger.info("result", g_best_pos=self.g_best_pos, g_best_value=self.g_best_value)
         for particle in self.particles:
             particle.print_history()
 
-    def receive_random_particle_JSON(self):
-        # check if PSO is still running
-        if self.generation_nr > self.max_generations:
-            return "PSO completed! Please, don't request anymore"
-        
-        # return a particle that is already running
-        for particle in self.particles:
-            if particle.state == State.REQUESTED:
-                return particle.request_parameters_JSON(self.generation_nr)
-            
-        # all particles completely solved or unsolved, so return a particle that has not been requested yet
-        for particle in self.particles:
-            if particle.state == State.UNSOLVED:
-                return particle.request_parameters_JSON(self.generation_nr)
-            
-        # each particle has been calculated, so the generation is complete
-        print(f"GENERATION {self.generation_nr} is completed!")
-        
-        # reset particles and get new global best
-        print(f"starting generation {self.generation_nr}")
-        
-        for particle in self.particles:
-            particle.reset()
-            # update new global best
-            if particle.current_fitness < self.g_best_value:
+    def __create_optimizer(self, name, nr_particles):
+        # fill_ratio is a setting of the study, so it does not move
+        return create_optimizer(name, nr_particles, DEFAULT_SPACE.fix("fill_ratio", self.fill_ratio))
+
+    def __queue_runs(self, particle):
+        generation = self.generations[particle.id]
+        if generation >= self.max_generations:
+            return
+        for run in particle.runs:
+            self.dispatcher.add((particle.id, generation, run.id))
+
+    def __is_open(self, key):
+        particle_id, generation, run_id = key
+        return generation == self.generations[particle_id] and self.particles[particle_id].is_open(run_id)
+
+    def is_completed(self):
+        return self.generation_nr >= self.max_generations
+
+    def run_seed(self, run_id):
+        """
+        the seed of the world a run is simulated in. It only depends on the run id, so the answers of run i of
+        all particles (in all generations) are paired: common random numbers
+        """
+        return self.seed + run_id
+
+    def __speculate(self, client):
+        """ lease a second copy of a straggling run, these leases are not journaled """
+        threshold = self.durations.threshold()
+        if threshold is None:
+            return None
+        lease = self.dispatcher.speculate(client, self.__is_open, threshold)
+        if lease is not None:
+            metrics.SPECULATIONS.inc()
+            logger.debug("speculative lease", key=lease.key, client=client, threshold=threshold)
+        return lease
+
+    def receive_random_particle(self, client = None, speculate = True):
+        """
+        lease an open run to client, returns its parameters or None when all open runs are leased.
+        With speculate, a straggling run is leased again when there is no unleased run left.
+        """
+        while not self.is_completed():
+            lease = self.dispatcher.acquire(client, self.__is_open)
+            if lease is None:
+                lease = self.__speculate(client) if speculate else None
+                if lease is None:
+                    return None
+                particle_id, generation, run_id = lease.key
+                return self.particles[particle_id].request_run(run_id, generation) | {"seed": self.run_seed(run_id)}
+            particle_id, generation, run_id = lease.key
+            particle = self.particles[particle_id]
+
+            # answer the run from the cache instead of dispatching it
+            if self.cache is not None:
+                answer = self.cache.get(particle.pos.get_values(), self.run_seed(run_id))
+                if answer is not None:
+                    self.update_fitness_value(particle_id, generation, run_id, answer, "cache")
+                    continue
+
+            self.__record({"type": "lease", "key": lease.key, "client": client, "issued_at": lease.issued_at, "deadline": lease.deadline})
+            metrics.LEASES.inc()
+            logger.debug("lease", particle_id=particle_id, generation=generation, run_id=run_id, client=client)
+            return particle.request_run(run_id, generation) | {"seed": self.run_seed(run_id)}
+        return None
+
+    def heartbeat(self, client = None):
+        """ the runs client should abort, because another client answered them first or they became obsolete """
+        return [{"particle_id": particle_id, "generation": generation, "run_id": run_id}
+                for particle_id, generation, run_id in self.dispatcher.pop_cancelled(client)]
+
+    def update_fitness_values(self, results, client = None):
+        """ submit a list of answers, returns the number of answers that were accepted """
+        accepted = 0
+        for result in results:
+            if self.update_fitness_value(result["particle_id"], result["generation"], result["run_id"], result["answer"], client):
+                accepted += 1
+        return accepted
+
+    def __move_particles(self, particles):
+        """ tell the optimizer the fitness of the completed particles and move them to the positions it asks for next """
+        indices = [particle.id for particle in particles]
+        self.optimizer.tell(indices, [particle.current_fitness for particle in particles], [particle.current_answers for particle in particles])
+        for particle in particles:
+            # update new global best, compared on the runs both have answered
+            if pairing.is_better(particle.current_answers, particle.current_fitness, self.g_best_answers, self.g_best_value):
                 self.g_best_pos = particle.pos.get_position_dict()
                 self.g_best_value = particle.current_fitness
+                self.g_best_answers = particle.current_answers
+
+        for particle, position in zip(particles, self.optimizer.ask(indices, self.g_best_pos)):
+            particle.move(position)
+            self.generations[particle.id] += 1
+
+    def __next_generation(self):
+        # each particle has been calculated, so the generation is complete
+        logger.info("generation completed", generation=self.generation_nr)
+        self.__observe_generation()
+
+        # get new global best and move all particles at once
+        self.__move_particles(self.particles)
+        self.__prescreen(self.particles)
+
+        self.nr_solved_particles = 0
+        self.dispatcher.clear()
+        if self.racing is not None:
+            self.racing.new_generation()
 
         # check if it was the last generation
         self.generation_nr += 1
-        if self.generation_nr >= self.max_generations:
-            print("SERVER: PSO completed!")
+        self.__migrate()
+        if self.is_completed():
+            logger.info("PSO completed")
             self.__print_result_PSO()
-            return "PSO completed! Please, don't request anymore"
+            self.take_snapshot()
+            return
+
+        logger.info("generation started", generation=self.generation_nr)
+        for particle in self.particles:
+            self.__queue_runs(particle)
+        self.take_snapshot()
+
+    def __migrate(self):
+        """ island mode: publish the global best and adopt the best of another island when it beats ours """
+        if self.migration is None or self.generation_nr % self.migration.interval != 0:
+            return
+        self.migration.publish({"generation": self.generation_nr, "g_best_pos": self.g_best_pos, "g_best_value": self.g_best_value,
+                                "g_best_answers": list(self.g_best_answers.items())})
+        for best in self.migration.collect():
+            answers = dict(best["g_best_answers"])
+            if pairing.is_better(answers, best["g_best_value"], self.g_best_answers, self.g_best_value):
+                self.__record({"type": "migrant", "island": best["island"], "g_best_pos": best["g_best_pos"],
+                               "g_best_value": best["g_best_value"], "g_best_answers": best["g_best_answers"]})
+                self.__adopt(best["g_best_pos"], best["g_best_value"], answers)
+                logger.info("migrant adopted", island=best["island"], g_best_value=best["g_best_value"])
+
+    def __adopt(self, g_best_pos, g_best_value, g_best_answers):
+        self.g_best_pos = dict(g_best_pos)
+        self.g_best_value = g_best_value
+        self.g_best_answers = g_best_answers
+        self.optimizer.adopt(self.g_best_pos, g_best_value, g_best_answers)
+
+    def __prescreen(self, particles):
+        """ plan the runs of the new positions of particles with the surrogate model """
+        if self.prescreening is None:
+            return
+        swarm = [particle.pos.get_values() for particle in self.particles]
+        plans = self.prescreening.plan([particle.pos.get_values() for particle in particles], swarm, Particle.nr_runs)
+        for particle, (nr_runs, predicted) in zip(particles, plans):
+            particle.plan_runs(nr_runs)
+            logger.debug("prescreened", particle_id=particle.id, nr_runs=nr_runs, predicted_fitness=predicted)
+
+    def __observe_generation(self):
+        now = time.time()
+        metrics.GENERATION_DURATION.observe(now - self.generation_started, self.study_id)
+        self.generation_started = now
 
-        # return particle new generation
-        return self.particles[0].request_parameters_JSON(self.generation_nr)
+    def __next_particle_generation(self, particle):
+        """ asynchronous mode: move a single particle with the current global best and stream its new runs into the queue """
+        self.__move_particles([particle])
+        self.__prescreen([particle])
+        logger.debug("particle generation started", particle_id=particle.id, generation=self.generations[particle.id])
 
-    def update_fitness_value(self, id, generation, run_id, fit_val):
+        # the study is as far as its slowest particle
+        if min(self.generations) > self.generation_nr:
+            logger.info("generation completed", generation=self.generation_nr)
+            self.__observe_generation()
+            if self.racing is not None:
+                self.racing.new_generation()
+            self.generation_nr = min(self.generations)
+            self.__migrate()
+        if self.generations[particle.id] < self.max_generations:
+            self.__queue_runs(particle)
+        elif self.is_completed():
+            logger.info("PSO completed")
+            self.__print_result_PSO()
+
+    def update_fitness_value(self, id, generation, run_id, fit_val, client = None):
+        """ returns True if the answer was accepted """
         # check if it is not a calculation for a previous generation:
-        if (self.generation_nr == generation):
-            self.particles[id].update_fit_value(fit_val, run_id, self.g_best_pos)
-            print("particle succesfully updated!")
+        if 0 <= id < len(self.particles) and self.generations[id] == generation:
+            # the first answer wins, other holders of a speculated run are asked to abort it
+            lease = self.dispatcher.release((id, generation, run_id), None if client == "cache" else client)
+            particle = self.particles[id]
+            accepted = particle.is_open(run_id)
+            if not accepted:
+                metrics.SUBMISSIONS.inc(1, "duplicate")
+                logger.debug("duplicate answer", particle_id=id, generation=generation, run_id=run_id, client=client)
+            elif client == "cache":
+                metrics.SUBMISSIONS.inc(1, "cache")
+            else:
+                metrics.SUBMISSIONS.inc(1, "accepted")
+            duration = None
+            if accepted and client != "cache" and lease is not None:
+                duration = time.time() - lease.issued_at
+                metrics.LEASE_DURATION.observe(duration, self.study_id)
+                self.durations.observe(duration)
+            if accepted:
+                self.__record({"type": "submit", "particle_id": id, "generation": generation, "run_id": run_id, "answer": fit_val, "client": client})
+                if self.results is not None:
+                    self.results.append({"time": time.time(), "particle_id": id, "generation": generation, "run_id": run_id, "seed": self.run_seed(run_id),
+                                         "answer": fit_val, "duration": duration, "client": client} | particle.pos.get_values())
+                if self.cache is not None and client != "cache":
+                    self.cache.put(particle.pos.get_values(), self.run_seed(run_id), fit_val)
+            nr_runs = len(particle.runs)
+            completed = particle.update_fit_value(fit_val, run_id, client, self.racing, self.g_best_value, self.g_best_answers,
+                                                  float(self.optimizer.best_values[id]), self.optimizer.best_answers[id])
+            # racing added runs to a close contender
+            for extra_run in particle.runs[nr_runs:]:
+                self.dispatcher.add((id, generation, extra_run.id))
+            if completed:
+                # racing stopped the particle early, the clients that still simulate its other runs can stop
+                for run in particle.runs:
+                    if not run.is_solved():
+                        self.dispatcher.revoke((id, generation, run.id))
+                if self.prescreening is not None:
+                    self.prescreening.observe(particle.pos.get_values(), particle.current_fitness, len(particle.get_answers()))
+                if self.mode == Mode.ASYNC:
+                    self.__next_particle_generation(particle)
+                else:
+                    self.nr_solved_particles += 1
+                    if self.nr_solved_particles == len(self.particles):
+                        self.__next_generation()
+            logger.debug("answer", particle_id=id, generation=generation, run_id=run_id, answer=fit_val, client=client, accepted=accepted)
+            if accepted and self.journal is not None and self.nr_records >= self.snapshot_every:
+                self.take_snapshot()
+            return accepted
 
         else:
-            print("the generations did not match!")
-            
\ No newline at end of file
+            metrics.SUBMISSIONS.inc(1, "stale")
+            logger.debug("the generations did not match", particle_id=id, generation=generation, run_id=run_id, client=client)
+            return False
+
+    def get_status(self):
+        return {
+            "generation": self.generation_nr,
+            "max_generations": self.max_generations,
+            "completed": self.is_completed(),
+            "mode": self.mode.name,
+            "optimizer": self.optimizer.name,
+            "nr_particles": len(self.particles),
+            "fill_ratio": self.fill_ratio,
+            "g_best_value": self.g_best_value,
+            "g_best_pos": dict(self.g_best_pos),
+            "runs_leased": self.dispatcher.nr_leased()
+        }
+
+    def __record(self, record):
+        if self.journal is not None:
+            self.journal.append(record)
+            self.nr_records += 1
+
+    def take_snapshot(self):
+        if self.journal is not None:
+            self.journal.write_snapshot(self.get_snapshot())
+            self.nr_records = 0
+
+    def get_snapshot(self):
+        """ the complete optimisation state as a JSON serializable dict """
+        return {
+            "mode": self.mode.name,
+            "max_generations": self.max_generations,
+            "fill_ratio": self.fill_ratio,
+            "seed": self.seed,
+            "generation_nr": self.generation_nr,
+            "generations": self.generations,
+            "nr_solved_particles": self.nr_solved_particles,
+            "g_best_pos": self.g_best_pos,
+            "g_best_value": self.g_best_value,
+            "g_best_answers": list(self.g_best_answers.items()),
+            "particles": [particle.get_snapshot() for particle in self.particles],
+            "optimizer": self.optimizer.get_snapshot(),
+            "racing": self.racing.get_snapshot() if self.racing is not None else None,
+            "prescreening": self.prescreening.get_snapshot() if self.prescreening is not None else None,
+            "results": self.results.get_snapshot() if self.results is not None else None,
+            "leases": [[lease.key, lease.holder, lease.issued_at, lease.deadline] for lease in self.dispatcher.leases.values()]
+        }
+
+    def restore_snapshot(self, snapshot : dict):
+        self.mode = Mode[snapshot["mode"]]
+        self.max_generations = snapshot["max_generations"]
+        self.fill_ratio = snapshot["fill_ratio"]
+        self.generation_nr = snapshot["generation_nr"]
+        self.generations = list(snapshot["generations"])
+        self.nr_solved_particles = snapshot["nr_solved_particles"]
+        self.g_best_pos = snapshot["g_best_pos"]
+        self.g_best_value = snapshot["g_best_value"]
+        self.seed = snapshot.get("seed", self.seed)
+        self.g_best_answers = dict(snapshot.get("g_best_answers", []))
+        self.particles = [Particle(i, particle_snapshot["pos"]) for i, particle_snapshot in enumerate(snapshot["particles"])]
+        for particle, particle_snapshot in zip(self.particles, snapshot["particles"]):
+            particle.restore_snapshot(particle_snapshot)
+        # the journaled study keeps the optimizer it was started with
+        self.optimizer = self.__create_optimizer(snapshot["optimizer"]["name"], len(self.particles))
+        self.optimizer.restore_snapshot(snapshot["optimizer"])
+        # the extra runs that racing already spent in this generation
+        if self.racing is not None and snapshot.get("racing") is not None:
+            self.racing.restore_snapshot(snapshot["racing"])
+        # the observations of the surrogate model
+        if self.prescreening is not None and snapshot.get("prescreening") is not None:
+            self.prescreening.restore_snapshot(snapshot["prescreening"])
+        # the results that were still buffered at the snapshot, replayed answers that are already in a chunk are not stored again
+        if self.results is not None and snapshot.get("results") is not None:
+            self.results.restore_snapshot(snapshot["results"])
+
+        self.dispatcher.clear()
+        for particle in self.particles:
+            self.__queue_runs(particle)
+        for key, holder, issued_at, deadline in snapshot["leases"]:
+            self.__restore_lease(tuple(key), holder, issued_at, deadline)
+
+    def __restore_lease(self, key, holder, issued_at, deadline):
+        particle_id, generation, run_id = key
+        if self.__is_open(key):
+            self.dispatcher.restore(key, holder, issued_at, deadline)
+            self.particles[particle_id].request_run(run_id, generation)
+
+    def replay(self, record : dict):
+        """ apply a journal record, this is only used during recovery so nothing is journaled again """
+        if record["type"] == "lease":
+            self.__restore_lease(tuple(record["key"]), record["client"], record["issued_at"], record["deadline"])
+        elif record["type"] == "submit":
+            self.update_fitness_value(record["particle_id"], record["generation"], record["run_id"], record["answer"], record["client"])
+        elif record["type"] == "migrant":
+            self.__adopt(record["g_best_pos"], record["g_best_value"], dict(record["g_best_answers"]))
@@ -1,9 +1,11 @@
 from flask import Flask
 from server import Application
+from config import studies_from_environment
 
 
-application = Application()
+# see config.settings_from_environment and config.studies_from_environment for the PSO_* environment variables
+application = Application(studies=studies_from_environment())
 
 # if __name__ == '__main__':
 app = Flask(__name__)
-application.define_routes(app)
+application.define_routes(app)
\ No newline at end of file
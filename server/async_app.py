@@ -0,0 +1,182 @@
+import asyncio
+import sys
+import time
+
+from aiohttp import web
+from PSO import PSO, COMPLETED
+from config import create_pso, settings_from_environment
+import encoding
+import metrics
+
+class AsyncApplication:
+    """
+    asyncio server with the same routes as server.Application, but /compute long-polls: when every
+    open run is leased, the request parks until a run becomes available (an answer completes a generation
+    or adds runs, or a lease expires) instead of returning {"wait": ...} straight away.
+    Everything runs on the event loop, so PSO is only ever touched by one thread.
+    """
+    poll_timeout = 30 # seconds a /compute request is parked at most
+
+    def __init__(self, pso : PSO):
+        self.pso = pso
+        self.work_available = asyncio.Condition()
+        self.nr_waiting = 0
+        metrics.RUNS_IN_FLIGHT.set_function(self.pso.dispatcher.nr_leased)
+
+    def define_routes(self, app : web.Application):
+        app.add_routes([
+            web.get('/compute', self.send_computation_parameters),
+            web.post('/submit', self.get_submission),
+            web.get('/compute_batch', self.send_computation_parameters_batch),
+            web.post('/submit_batch', self.get_submission_batch),
+            web.post('/heartbeat', self.get_heartbeat),
+            web.get('/status', self.send_status),
+            web.get('/cache', self.send_cache_statistics),
+            web.get('/metrics', self.send_metrics),
+            web.get('/history', self.send_history)
+        ])
+
+    def __parse_lease(self, request):
+        """ client, number of runs and poll timeout of a /compute(_batch) request, ValueError when they are invalid """
+        client = request.query.get("client_id", request.remote)
+        n = int(request.query.get("n", 1))
+        timeout = float(request.query.get("timeout", self.poll_timeout))
+        # also rejects NaN
+        if not timeout >= 0:
+            raise ValueError("timeout must be a number >= 0, not " + request.query["timeout"])
+        return client, max(1, n), min(timeout, self.poll_timeout)
+
+    async def __lease(self, client, n, timeout):
+        """ lease up to n runs, parks the request until a run is available or the poll timeout passes """
+        end = time.monotonic() + timeout
+        while True:
+            if self.pso.is_completed():
+                return None
+            runs = []
+            while len(runs) < n:
+                parameters = self.pso.receive_random_particle(client)
+                if parameters is None:
+                    break
+                runs.append(parameters)
+            if runs or self.pso.is_completed():
+                return runs
+
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return []
+            # wake up when the first lease expires as well
+            deadline = self.pso.dispatcher.next_deadline()
+            if deadline is not None:
+                remaining = min(remaining, max(0.0, deadline - time.time()) + 0.01)
+            await self.__wait_for_work(remaining)
+
+    async def __wait_for_work(self, timeout):
+        async with self.work_available:
+            self.nr_waiting += 1
+            try:
+                await asyncio.wait_for(self.work_available.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.nr_waiting -= 1
+
+    async def __notify(self):
+        """ wake as many parked requests as there are runs in the ready queue """
+        if self.nr_waiting == 0:
+            return
+        nr_ready = len(self.pso.dispatcher.ready)
+        if nr_ready > 0 or self.pso.is_completed():
+            async with self.work_available:
+                if self.pso.is_completed():
+                    self.work_available.notify_all()
+                else:
+                    self.work_available.notify(nr_ready)
+
+    @staticmethod
+    async def __read(request):
+        """ the message of the request, JSON or msgpack depending on its content type """
+        return encoding.decode(await request.read(), request.content_type)
+
+    @staticmethod
+    def __respond(request, message):
+        body, content_type = encoding.encode(message, request.headers.get("Accept"))
+        if isinstance(body, str):
+            return web.Response(text=body, content_type=content_type)
+        return web.Response(body=body, content_type=content_type)
+
+    async def send_computation_parameters(self, request):
+        try:
+            client, _, timeout = self.__parse_lease(request)
+        except ValueError as error:
+            return web.json_response({"error": str(error)}, status=400)
+        runs = await self.__lease(client, 1, timeout)
+        if runs is None:
+            return self.__respond(request, COMPLETED)
+        if not runs:
+            # nothing came up during the poll, the client can poll again right away
+            return self.__respond(request, {"wait": 0})
+        return self.__respond(request, runs[0])
+
+    async def send_computation_parameters_batch(self, request):
+        try:
+            client, n, timeout = self.__parse_lease(request)
+        except ValueError as error:
+            return web.json_response({"error": str(error)}, status=400)
+        runs = await self.__lease(client, n, timeout)
+        if runs is None:
+            return self.__respond(request, COMPLETED)
+        if not runs:
+            return self.__respond(request, {"wait": 0})
+        return self.__respond(request, {"runs": runs})
+
+    async def get_submission(self, request):
+        resp = await self.__read(request)
+        client = resp.get("client_id", request.remote)
+        accepted = self.pso.update_fitness_value(resp["particle_id"], resp["generation"], resp["run_id"], resp["answer"], client)
+        await self.__notify()
+        return self.__respond(request, {"accepted": accepted, "abort": self.pso.heartbeat(client)})
+
+    async def get_submission_batch(self, request):
+        resp = await self.__read(request)
+        client = resp.get("client_id", request.remote)
+        accepted = self.pso.update_fitness_values(resp["results"], client)
+        await self.__notify()
+        return self.__respond(request, {"accepted": accepted, "abort": self.pso.heartbeat(client)})
+
+    async def get_heartbeat(self, request):
+        resp = await self.__read(request)
+        client = resp.get("client_id", request.remote)
+        return self.__respond(request, {"abort": self.pso.heartbeat(client)})
+
+    async def send_status(self, request):
+        return web.json_response(self.pso.get_status())
+
+    async def send_cache_statistics(self, request):
+        if self.pso.cache is None:
+            return web.json_response({"enabled": False})
+        return web.json_response({"enabled": True} | self.pso.cache.get_statistics())
+
+    async def send_history(self, request):
+        if self.pso.results is None:
+            return web.json_response({"enabled": False})
+        filters = {name: value for name, value in request.query.items() if name not in ("group_by", "limit")}
+        try:
+            history = self.pso.results.query(filters, request.query.get("group_by"), int(request.query.get("limit", 1000)))
+        except ValueError as error:
+            return web.json_response({"error": str(error)}, status=400)
+        return web.json_response({"enabled": True, "history": history})
+
+    async def send_metrics(self, request):
+        return web.Response(text=metrics.REGISTRY.render(), content_type="text/plain")
+
+def create_app(pso : PSO = None):
+    if pso is None:
+        pso = create_pso(**settings_from_environment())
+    app = web.Application()
+    AsyncApplication(pso).define_routes(app)
+    return app
+
+if __name__ == '__main__':
+    # async_app.py [PORT (OPTIONAL)], see config.settings_from_environment for the PSO_* environment variables
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    web.run_app(create_app(), port=port)
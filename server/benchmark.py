@@ -0,0 +1,202 @@
+"""
+End-to-end benchmark of the PSO server.
+
+Starts the Flask app of server.py on localhost (or uses --url) and drives it with synthetic clients
+that follow the protocol of client.Client: GET /compute, "simulate", POST /submit. Prints a JSON
+report with latency percentiles, throughput, duplicate work and wall time per generation.
+
+    python benchmark.py --clients 32 --eval-time 0.05 --straggler-rate 0.05 --output bench.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+class Recorder:
+    """ collects the measurements of all synthetic clients """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.compute_latency = []
+        self.submit_latency = []
+        self.submitted = set()
+        self.nr_submissions = 0
+        self.nr_duplicates = 0
+        self.nr_failures = 0
+        self.nr_waits = 0
+        self.generation_start = {}
+        self.generation_end = {}
+
+    def leased(self, latency, job):
+        with self.lock:
+            self.compute_latency.append(latency)
+            if job is not None:
+                self.generation_start.setdefault(job["generation"], time.perf_counter())
+
+    def submitted_run(self, latency, job):
+        key = (job.get("study_id"), job["particle_id"], job["generation"], job["run_id"])
+        with self.lock:
+            self.submit_latency.append(latency)
+            self.nr_submissions += 1
+            if key in self.submitted:
+                self.nr_duplicates += 1
+            self.submitted.add(key)
+            self.generation_end[job["generation"]] = time.perf_counter()
+
+    def report(self, wall_time):
+        def percentiles(values):
+            if not values:
+                return {}
+            values = np.array(values) * 1000
+            return {"count": len(values), "p50_ms": float(np.percentile(values, 50)), "p90_ms": float(np.percentile(values, 90)),
+                    "p99_ms": float(np.percentile(values, 99)), "max_ms": float(values.max())}
+
+        generations = {str(g): self.generation_end[g] - self.generation_start[g] for g in sorted(self.generation_end) if g in self.generation_start}
+        return {
+            "wall_time_s": wall_time,
+            "compute": percentiles(self.compute_latency),
+            "submit": percentiles(self.submit_latency),
+            "runs_per_s": len(self.submitted) / wall_time if wall_time > 0 else 0,
+            "unique_runs": len(self.submitted),
+            "submissions": self.nr_submissions,
+            "duplicate_ratio": self.nr_duplicates / self.nr_submissions if self.nr_submissions else 0,
+            "failed_runs": self.nr_failures,
+            "waits": self.nr_waits,
+            "generation_wall_time_s": generations
+        }
+
+class SyntheticClient:
+    """ mimics client.Client, but sleeps instead of running a simulation """
+    def __init__(self, id, url, recorder : Recorder, args, deadline):
+        self.id = id
+        self.url = url
+        self.recorder = recorder
+        self.args = args
+        self.deadline = deadline
+        self.rng = random.Random(args.seed * 1000 + id)
+        # a keep-alive session like client.Connection, so the latencies do not include a new connection per request
+        self.session = requests.Session()
+
+    def run(self):
+        try:
+            self.__run()
+        finally:
+            self.session.close()
+
+    def __run(self):
+        while time.perf_counter() < self.deadline:
+            start = time.perf_counter()
+            response = self.session.get(self.url + "compute", params={"client_id": self.id})
+            latency = time.perf_counter() - start
+            try:
+                job = response.json()
+            except ValueError:
+                # "PSO completed!"
+                self.recorder.leased(latency, None)
+                return
+            if "wait" in job:
+                self.recorder.leased(latency, None)
+                with self.recorder.lock:
+                    self.recorder.nr_waits += 1
+                time.sleep(min(job["wait"], self.args.wait))
+                continue
+            self.recorder.leased(latency, job)
+
+            time.sleep(self.__evaluation_time())
+            if self.rng.random() < self.args.failure_rate:
+                # the simulation crashed, the lease has to expire
+                with self.recorder.lock:
+                    self.recorder.nr_failures += 1
+                continue
+
+            answer = job["rw_mean"] / 1000 + job["tao"] / 1000 + self.rng.gauss(0, 1)
+            start = time.perf_counter()
+            self.session.post(self.url + "submit", json={"particle_id": job["particle_id"], "generation": job["generation"],
+                                                         "run_id": job["run_id"], "answer": answer, "client_id": self.id, "study_id": job.get("study_id")})
+            self.recorder.submitted_run(time.perf_counter() - start, job)
+
+    def __evaluation_time(self):
+        duration = max(0.0, self.rng.gauss(self.args.eval_time, self.args.eval_jitter * self.args.eval_time))
+        if self.rng.random() < self.args.straggler_rate:
+            duration *= self.args.straggler_factor
+        return duration
+
+def start_server(args):
+    """ run the Flask app of server.py in a background thread and return its url """
+    from flask import Flask
+    from werkzeug.serving import make_server
+    from PSO import Mode
+    from config import create_pso
+    from server import Application
+    from study import Study
+
+    pso = create_pso(Mode[args.mode.upper()], nr_particles=args.particles, max_generations=args.generations,
+                     lease_duration=args.lease_duration, retry_after=args.wait)
+    app = Flask(__name__)
+    Application(app, studies=[Study("default", pso)])
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:" + str(server.server_port) + "/"
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of starting one, e.g. http://localhost:5000/")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--particles", type=int, default=20)
+    parser.add_argument("--generations", type=int, default=5)
+    parser.add_argument("--mode", default="sync", choices=["sync", "async"])
+    parser.add_argument("--eval-time", type=float, default=0.02, help="mean simulated evaluation time in seconds")
+    parser.add_argument("--eval-jitter", type=float, default=0.2, help="standard deviation of the evaluation time, relative to the mean")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of runs that are never submitted")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="fraction of runs that take straggler-factor times longer")
+    parser.add_argument("--straggler-factor", type=float, default=10.0)
+    parser.add_argument("--lease-duration", type=float, default=2.0, help="seconds before the server hands out a leased run again")
+    parser.add_argument("--wait", type=float, default=0.05, help="maximum seconds a client sleeps when the server asks it to wait")
+    parser.add_argument("--timeout", type=float, default=600, help="stop the benchmark after this many seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="keep the log output of the server")
+    args = parser.parse_args(argv)
+
+    recorder = Recorder()
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+            logging.getLogger("pso").setLevel(logging.WARNING)
+        server = None
+        url = args.url
+        if url is None:
+            server, url = start_server(args)
+
+        start = time.perf_counter()
+        deadline = start + args.timeout
+        clients = [SyntheticClient(i, url, recorder, args, deadline) for i in range(args.clients)]
+        threads = [threading.Thread(target=client.run) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - start
+        if server is not None:
+            server.shutdown()
+
+    report = recorder.report(wall_time)
+    report["config"] = vars(args)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import shelve
+from collections import OrderedDict
+
+class ResultCache:
+    """
+    LRU cache of run answers, keyed by the quantized position of a particle and the seed of the run.
+    Entries that are evicted are spilled to a shelve file when spill_path is given, so they can still be hit later.
+    """
+    # quantization step per parameter, positions that round to the same grid point share their answers
+    default_steps = {
+        "rw_mean": 50,
+        "rw_variance": 50,
+        "tao": 25,
+        "u_plus": 0.01,
+        "p_c": 0.005,
+        "fill_ratio": 0.01
+    }
+
+    def __init__(self, capacity = 100000, steps : dict = None, spill_path = None):
+        self.capacity = capacity
+        self.steps = self.default_steps if steps is None else steps
+        self.entries = OrderedDict()
+        self.spill = shelve.open(spill_path) if spill_path is not None else None
+        self.nr_hits = 0
+        self.nr_spill_hits = 0
+        self.nr_misses = 0
+        self.nr_evictions = 0
+
+    def key(self, position : dict, seed):
+        grid = [round(position[name] / step) for name, step in sorted(self.steps.items())]
+        return ",".join(str(value) for value in grid) + "|" + str(seed)
+
+    def get(self, position : dict, seed):
+        """ the cached answer of a run, None on a miss """
+        key = self.key(position, seed)
+        answer = self.entries.get(key)
+        if answer is not None:
+            self.entries.move_to_end(key)
+            self.nr_hits += 1
+            return answer
+
+        if self.spill is not None and key in self.spill:
+            answer = self.spill[key]
+            self.nr_spill_hits += 1
+            self.__insert(key, answer)
+            return answer
+
+        self.nr_misses += 1
+        return None
+
+    def put(self, position : dict, seed, answer):
+        self.__insert(self.key(position, seed), answer)
+
+    def __insert(self, key, answer):
+        self.entries[key] = answer
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            evicted_key, evicted_answer = self.entries.popitem(last=False)
+            self.nr_evictions += 1
+            if self.spill is not None:
+                self.spill[evicted_key] = evicted_answer
+
+    def get_statistics(self):
+        lookups = self.nr_hits + self.nr_spill_hits + self.nr_misses
+        return {
+            "entries": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.nr_hits,
+            "spill_hits": self.nr_spill_hits,
+            "misses": self.nr_misses,
+            "evictions": self.nr_evictions,
+            "hit_rate": (self.nr_hits + self.nr_spill_hits) / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
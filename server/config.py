@@ -0,0 +1,87 @@
+import json
+import os
+from PSO import PSO, Mode
+from racing import RacingPolicy
+from cache import ResultCache
+from journal import Journal, recover
+from results import ResultStore
+from prescreening import Prescreening
+from island import MigrationChannel
+from study import Study
+
+def create_pso(mode=Mode.SYNC, journal_dir=None, racing=None, cache=None, nr_particles=None, max_generations=None, fill_ratio=None, seed=None, results_dir=None, prescreening=None, migration_dir=None, island_id=None, optimizer="pso", lease_duration=None, retry_after=None):
+    pso = PSO(mode, racing, cache, nr_particles, max_generations, fill_ratio, seed, prescreening, optimizer, lease_duration, retry_after)
+    if results_dir is not None:
+        # attached before the recovery, so the replayed answers that were still buffered at a crash are stored
+        pso.results = ResultStore(results_dir)
+    if journal_dir is not None:
+        # rebuild the state of a previous server from its journal and keep journaling
+        recover(pso, Journal(journal_dir))
+    if migration_dir is not None:
+        # island mode, attached after the recovery as well: adopted migrants are replayed from the journal
+        pso.migration = MigrationChannel(migration_dir, island_id)
+    return pso
+
+def settings_from_environment(study_id = None):
+    """ the settings of create_pso, shared by the Flask (app.py) and asyncio (async_app.py) servers """
+    # PSO_MODE=async lets every particle move on without waiting for the rest of its generation
+    # PSO_OPTIMIZER=pso|cmaes|de chooses the algorithm that moves the particles (a particle swarm by default)
+    # PSO_JOURNAL=[DIRECTORY] journals the study there and recovers it after a restart
+    # PSO_RACING=1 stops clearly bad particles early and gives close contenders extra runs
+    racing = RacingPolicy() if os.environ.get("PSO_RACING") == "1" else None
+    # PSO_PRESCREEN=1 gives positions that a surrogate model of the fitness predicts to be bad fewer runs
+    prescreening = Prescreening() if os.environ.get("PSO_PRESCREEN") == "1" else None
+    # PSO_CACHE=[CAPACITY] answers runs of (nearly) identical positions from a cache, PSO_CACHE_SPILL=[FILE] keeps evicted answers on disk
+    cache = None
+    if "PSO_CACHE" in os.environ:
+        spill_path = os.environ.get("PSO_CACHE_SPILL")
+        if spill_path is not None and study_id is not None:
+            spill_path += "." + study_id
+        cache = ResultCache(int(os.environ["PSO_CACHE"]), spill_path=spill_path)
+    journal_dir = os.environ.get("PSO_JOURNAL")
+    if journal_dir is not None and study_id is not None:
+        journal_dir = os.path.join(journal_dir, study_id)
+    # PSO_RESULTS=[DIRECTORY] stores every accepted answer there, see the /history route
+    results_dir = os.environ.get("PSO_RESULTS")
+    if results_dir is not None and study_id is not None:
+        results_dir = os.path.join(results_dir, study_id)
+    # PSO_MIGRATION=[DIRECTORY] and PSO_ISLAND=[ID] run this server as one island (shard) of a study, see router.py
+    migration_dir = os.environ.get("PSO_MIGRATION")
+    island_id = os.environ.get("PSO_ISLAND")
+    if migration_dir is not None and not island_id:
+        # the id names the migrant file of the island, so it has to stay the same after a restart
+        raise ValueError("PSO_MIGRATION needs a PSO_ISLAND id that is unique per shard")
+    if migration_dir is not None and study_id is not None:
+        migration_dir = os.path.join(migration_dir, study_id)
+    return {
+        "mode": Mode[os.environ.get("PSO_MODE", "sync").upper()],
+        "optimizer": os.environ.get("PSO_OPTIMIZER", "pso"),
+        "migration_dir": migration_dir,
+        "island_id": island_id,
+        "journal_dir": journal_dir,
+        "results_dir": results_dir,
+        "racing": racing,
+        "prescreening": prescreening,
+        "cache": cache
+    }
+
+def studies_from_environment():
+    """
+    PSO_STUDIES is a JSON list of studies, e.g. [{"id": "fr48", "fill_ratio": 0.48, "weight": 2}, {"id": "fr52", "fill_ratio": 0.52}],
+    with optional "nr_particles", "max_generations", "seed" (the world seed of run 0) and "optimizer" (see PSO_OPTIMIZER) per study. Without PSO_STUDIES there is one study, "default".
+    The other PSO_* settings apply to every study, each study journals to its own subdirectory of PSO_JOURNAL
+    (and stores its results in its own subdirectory of PSO_RESULTS).
+    """
+    configs = json.loads(os.environ.get("PSO_STUDIES", '[{"id": "default"}]'))
+    studies = []
+    for config in configs:
+        # the share of a study is its weight relative to the others, see study.StudyScheduler
+        weight = config.get("weight", 1.0)
+        if not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError("the weight of study " + str(config["id"]) + " must be a number > 0, not " + repr(weight))
+        # racing and cache keep state, so every study gets its own
+        settings = settings_from_environment(config["id"] if "PSO_STUDIES" in os.environ else None)
+        settings["optimizer"] = config.get("optimizer", settings["optimizer"])
+        pso = create_pso(**settings, nr_particles=config.get("nr_particles"), max_generations=config.get("max_generations"), fill_ratio=config.get("fill_ratio"), seed=config.get("seed"))
+        studies.append(Study(config["id"], pso, weight))
+    return studies
@@ -0,0 +1,52 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+class PSOCore:
+    """
+    Single writer around the optimisation state (a PSO or a StudyScheduler). One thread owns the state and
+    executes the commands of a queue one by one, request handlers wait for the Future of their command.
+    After the queue has been drained, the core publishes the immutable result of state.get_status(),
+    so read-only status queries never wait for the writer.
+    """
+    def __init__(self, state):
+        self.state = state
+        self.commands = queue.SimpleQueue()
+        self.status = self.state.get_status()
+        self.thread = threading.Thread(target=self.__run, name="pso-core", daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args):
+        """ queue function(*args) for the writer thread, returns a Future of its result """
+        future = Future()
+        self.commands.put((future, function, args))
+        return future
+
+    def call(self, function, *args):
+        return self.submit(function, *args).result()
+
+    def get_status(self):
+        return self.status
+
+    def stop(self):
+        self.commands.put(None)
+        self.thread.join()
+
+    def __run(self):
+        while True:
+            command = self.commands.get()
+            # execute everything that is queued before publishing a new status
+            while command is not None:
+                future, function, args = command
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(function(*args))
+                    except BaseException as exception:
+                        future.set_exception(exception)
+                try:
+                    command = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+            self.status = self.state.get_status()
+            if command is None:
+                return
@@ -0,0 +1,150 @@
+import time
+from collections import deque
+
+class Lease:
+    """ a run that has been handed out to a client, valid until its deadline """
+    def __init__(self, key, holder, issued_at, deadline):
+        self.key = key # (particle_id, generation, run_id)
+        self.holder = holder
+        self.issued_at = issued_at
+        self.deadline = deadline
+
+    def is_expired(self, now):
+        return now >= self.deadline
+
+class Dispatcher:
+    """
+    Hands out runs in O(1).
+
+    Unsolved runs wait in a ready queue, handed out runs are stored in a lease table.
+    Runs that are solved while they are still queued are dropped lazily when they reach
+    the front of the queue, leases that pass their deadline are put back in the queue.
+
+    A straggling run can be leased to a second client (speculate). The first answer wins,
+    the other holder finds the run in its cancelled runs and can abort it.
+    """
+    def __init__(self, lease_duration = 600):
+        self.lease_duration = lease_duration
+        self.ready = deque()
+        self.leases = {}
+        # all leases are equally long, so the leases are issued in order of their deadline
+        self.expiry = deque()
+        self.backups = {} # speculative second leases of straggling runs
+        # leases that could still get a speculative copy, in order of issue, see speculate
+        self.candidates = deque()
+        self.cancelled = {} # holder -> keys of runs the holder should abort
+
+    def add(self, key):
+        self.ready.append(key)
+
+    def clear(self):
+        """ drop all runs, the holders of outstanding leases are asked to abort them """
+        for lease in list(self.leases.values()) + list(self.backups.values()):
+            self.__cancel(lease)
+        self.ready.clear()
+        self.leases.clear()
+        self.backups.clear()
+        self.expiry.clear()
+        self.candidates.clear()
+
+    def acquire(self, holder, is_open, now = None):
+        """ lease the next open run to holder, returns None when there is no open run left in the queue """
+        if now is None:
+            now = time.time()
+        self.reclaim_expired(now)
+
+        while self.ready:
+            key = self.ready.popleft()
+            # the run could have been solved or leased again since it was queued
+            if key in self.leases or not is_open(key):
+                continue
+            lease = Lease(key, holder, now, now + self.lease_duration)
+            self.leases[key] = lease
+            self.expiry.append(lease)
+            self.candidates.append(lease)
+            return lease
+        return None
+
+    def speculate(self, holder, is_open, threshold, now = None):
+        """ lease a second copy of the oldest run that has been leased for longer than threshold seconds, None if there is none """
+        if now is None:
+            now = time.time()
+        # leases that can never be speculated on again leave the front of the queue for good, so a call is amortized O(1)
+        while self.candidates and not self.__is_candidate(self.candidates[0], is_open):
+            self.candidates.popleft()
+        for lease in self.candidates:
+            # the candidates are in order of issue, so the remaining leases are younger
+            if now - lease.issued_at < threshold:
+                break
+            if str(lease.holder) == str(holder) or not self.__is_candidate(lease, is_open):
+                continue
+            backup = Lease(lease.key, holder, now, now + self.lease_duration)
+            self.backups[lease.key] = backup
+            self.expiry.append(backup)
+            return backup
+        return None
+
+    def __is_candidate(self, lease, is_open):
+        """ the lease is still the lease of its run, the run is open and has no speculative copy yet """
+        return self.leases.get(lease.key) is lease and lease.key not in self.backups and is_open(lease.key)
+
+    def restore(self, key, holder, issued_at, deadline):
+        """ re-create a lease that was handed out before a restart """
+        lease = Lease(key, holder, issued_at, deadline)
+        self.leases[key] = lease
+        self.expiry.append(lease)
+        self.candidates.append(lease)
+        return lease
+
+    def release(self, key, holder = None):
+        """
+        remove the leases of a run and return the lease of holder (or the first lease if holder has none).
+        When holder answered the run, every other holder of the run is asked to abort it.
+        """
+        own = None
+        leases = [lease for lease in (self.leases.pop(key, None), self.backups.pop(key, None)) if lease is not None]
+        for lease in leases:
+            if str(lease.holder) == str(holder):
+                own = lease
+            elif holder is not None:
+                self.__cancel(lease)
+        if own is None and leases:
+            own = leases[0]
+        return own
+
+    def revoke(self, key):
+        """ drop the leases of a run that is no longer needed, their holders are asked to abort it """
+        for lease in (self.leases.pop(key, None), self.backups.pop(key, None)):
+            if lease is not None:
+                self.__cancel(lease)
+
+    def __cancel(self, lease):
+        self.cancelled.setdefault(str(lease.holder), set()).add(lease.key)
+
+    def pop_cancelled(self, holder):
+        """ the runs holder should abort since the last call """
+        return sorted(self.cancelled.pop(str(holder), ()))
+
+    def reclaim_expired(self, now = None):
+        """ put the runs of expired leases back in the ready queue """
+        if now is None:
+            now = time.time()
+        while self.expiry and self.expiry[0].is_expired(now):
+            lease = self.expiry.popleft()
+            if self.backups.get(lease.key) is lease:
+                del self.backups[lease.key]
+            # skip leases that were released or replaced in the meantime
+            elif self.leases.get(lease.key) is lease:
+                del self.leases[lease.key]
+                backup = self.backups.pop(lease.key, None)
+                if backup is not None:
+                    # the speculative copy is still running, it becomes the lease of the run
+                    self.leases[lease.key] = backup
+                else:
+                    self.ready.appendleft(lease.key)
+
+    def next_deadline(self):
+        return self.expiry[0].deadline if self.expiry else None
+
+    def nr_leased(self):
+        return len(self.leases)
@@ -0,0 +1,30 @@
+import json
+
+try:
+    import msgpack
+except ImportError:
+    # msgpack is optional, without it everything is JSON
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+def accepts_msgpack(accept : str):
+    """ the client asked for msgpack in its Accept header and the server can produce it """
+    return msgpack is not None and accept is not None and MSGPACK in accept
+
+def decode(body : bytes, content_type : str):
+    """ the message of a request body, msgpack when the content type says so and JSON otherwise """
+    if content_type is not None and content_type.startswith(MSGPACK):
+        if msgpack is None:
+            raise ValueError("msgpack is not installed on the server")
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+def encode(message, accept : str = None):
+    """ returns (body, content type), messages that are a string (PSO completed) stay plain text """
+    if isinstance(message, str):
+        return message, "text/plain"
+    if accepts_msgpack(accept):
+        return msgpack.packb(message), MSGPACK
+    return json.dumps(message), JSON
@@ -0,0 +1,40 @@
+import glob
+import json
+import os
+import time
+
+class MigrationChannel:
+    """
+    Island mode: every shard runs its own swarm and publishes its global best to a file in a shared
+    directory, island_<id>.json. Every interval generations a shard publishes its best and reads the
+    bests of the other islands. Files are replaced atomically, so a reader never sees half a file.
+    """
+    def __init__(self, directory : str, island_id : str, interval = 2):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.island_id = str(island_id)
+        self.interval = interval # generations between two migrations
+
+    def __path(self, island_id):
+        return os.path.join(self.directory, "island_" + str(island_id) + ".json")
+
+    def publish(self, best : dict):
+        path = self.__path(self.island_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(best | {"island": self.island_id, "time": time.time()}, file)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """ the last published bests of the other islands """
+        bests = []
+        for path in glob.glob(os.path.join(self.directory, "island_*.json")):
+            if path == self.__path(self.island_id):
+                continue
+            try:
+                with open(path, 'r') as file:
+                    bests.append(json.load(file))
+            except (OSError, ValueError):
+                # the island is being replaced right now, its best comes along next time
+                continue
+        return bests
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+from log import get_logger
+
+logger = get_logger("journal")
+
+class Journal:
+    """
+    Append-only journal of leases and submissions plus a compact snapshot of the PSO state.
+
+    Records are written to a buffered file and made durable in batches by a background thread,
+    so appending a record does not wait for the disk. Writing a snapshot truncates the journal:
+    on startup the state is the last snapshot plus the records that were journaled after it.
+    """
+    journal_name = "journal.log"
+    snapshot_name = "snapshot.json"
+
+    def __init__(self, directory : str, flush_interval = 0.5, flush_size = 512):
+        os.makedirs(directory, exist_ok=True)
+        self.journal_path = os.path.join(directory, self.journal_name)
+        self.snapshot_path = os.path.join(directory, self.snapshot_name)
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+        self.lock = threading.Lock()
+        self.file = open(self.journal_path, 'a', buffering=1 << 16)
+        self.nr_pending = 0
+        self.flush_requested = threading.Event()
+        self.closed = False
+        self.flusher = threading.Thread(target=self.__flush_loop, daemon=True)
+        self.flusher.start()
+
+    def append(self, record : dict):
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.nr_pending += 1
+            if self.nr_pending >= self.flush_size:
+                self.flush_requested.set()
+
+    def sync(self):
+        """ flush the buffered records and fsync them to disk """
+        with self.lock:
+            if self.closed or self.nr_pending == 0:
+                return
+            self.file.flush()
+            self.nr_pending = 0
+            # fsync a duplicate descriptor, so appends do not wait for the disk
+            fd = os.dup(self.file.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __flush_loop(self):
+        while not self.closed:
+            self.flush_requested.wait(self.flush_interval)
+            self.flush_requested.clear()
+            self.sync()
+
+    def write_snapshot(self, snapshot : dict):
+        """ atomically replace the snapshot and start a new, empty journal """
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(snapshot, file, separators=(',', ':'))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        with self.lock:
+            self.file.close()
+            self.file = open(self.journal_path, 'w', buffering=1 << 16)
+            self.nr_pending = 0
+
+    def read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return None
+        with open(self.snapshot_path, 'r') as file:
+            return json.load(file)
+
+    def read_records(self):
+        """ all complete records of the journal, a torn last line of a crash is skipped """
+        with self.lock:
+            self.file.flush()
+        with open(self.journal_path, 'r') as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    break
+                yield json.loads(line)
+
+    def close(self):
+        self.sync()
+        with self.lock:
+            self.closed = True
+            self.file.close()
+        self.flush_requested.set()
+
+def recover(pso, journal : Journal):
+    """ rebuild pso from the snapshot and journal, then journal everything that happens to it from now on """
+    snapshot = journal.read_snapshot()
+    if snapshot is not None:
+        pso.restore_snapshot(snapshot)
+
+    nr_records = 0
+    for record in journal.read_records():
+        pso.replay(record)
+        nr_records += 1
+    logger.info("recovered", generation=pso.generation_nr, snapshot=journal.snapshot_path, nr_records=nr_records)
+
+    pso.journal = journal
+    # start from a compact state, so the next restart does not replay these records again
+    pso.take_snapshot()
+    return pso
@@ -0,0 +1,60 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+class StructuredFormatter(logging.Formatter):
+    """ one JSON object per line: time, level, logger, event and the fields of the record """
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+class StructuredLogger:
+    """ logger.info("event", key=value, ...) """
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def __log(self, level, event, fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self.__log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self.__log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self.__log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self.__log(logging.ERROR, event, fields)
+
+def _configure():
+    # the request path only puts records on a queue, a listener thread formats and writes them
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(StructuredFormatter())
+    listener = logging.handlers.QueueListener(records, output)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger("pso")
+    root.addHandler(logging.handlers.QueueHandler(records))
+    # PSO_LOG_LEVEL=debug also logs every lease and answer
+    root.setLevel(os.environ.get("PSO_LOG_LEVEL", "info").upper())
+    root.propagate = False
+
+_configure()
+
+def get_logger(name):
+    return StructuredLogger("pso." + name)
@@ -0,0 +1,113 @@
+import bisect
+import threading
+
+def _format_labels(names, values, extra = None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(name + '="' + str(value).replace('"', '\\"') + '"' for name, value in pairs) + "}"
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount = 1, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name + _format_labels(self.labels, key), value) for key, value in self.values.items()]
+
+class Gauge:
+    """ a value that is read when the metrics are scraped """
+    type = "gauge"
+
+    def __init__(self, name, documentation, function = None):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        value = self.function() if self.function is not None else self.value
+        return [(self.name, value)]
+
+class Histogram:
+    type = "histogram"
+    default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+    def __init__(self, name, documentation, labels = (), buckets = default_buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {} # label values -> [bucket counts, sum, count]
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in self.series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((self.name + "_bucket" + _format_labels(self.labels, key, ("le", bound)), cumulative))
+                samples.append((self.name + "_bucket" + _format_labels(self.labels, key, ("le", "+Inf")), count))
+                samples.append((self.name + "_sum" + _format_labels(self.labels, key), total))
+                samples.append((self.name + "_count" + _format_labels(self.labels, key), count))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """ all metrics in the Prometheus text exposition format """
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP " + metric.name + " " + metric.documentation)
+            lines.append("# TYPE " + metric.name + " " + metric.type)
+            for name, value in metric.samples():
+                lines.append(name + " " + repr(float(value)))
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+DISPATCH_LATENCY = REGISTRY.register(Histogram("pso_dispatch_seconds", "Time to answer a /compute request"))
+SUBMIT_LATENCY = REGISTRY.register(Histogram("pso_submit_seconds", "Time to answer a /submit request"))
+LEASE_DURATION = REGISTRY.register(Histogram("pso_lease_to_submit_seconds", "Time between leasing a run and receiving its answer", ("study",)))
+GENERATION_DURATION = REGISTRY.register(Histogram("pso_generation_seconds", "Wall time of a generation", ("study",)))
+LEASES = REGISTRY.register(Counter("pso_leases_total", "Runs handed out to clients"))
+SPECULATIONS = REGISTRY.register(Counter("pso_speculative_leases_total", "Straggling runs that were leased to a second client"))
+SUBMISSIONS = REGISTRY.register(Counter("pso_submissions_total", "Answers received, by outcome", ("outcome",)))
+RUNS_IN_FLIGHT = REGISTRY.register(Gauge("pso_runs_in_flight", "Runs that are leased and not answered yet"))
@@ -0,0 +1,269 @@
+import math
+
+import numpy as np
+from swarm import DEFAULT_SPACE, ParameterSpace
+import pairing
+
+class Optimizer:
+    """
+    Ask/tell interface between the run dispatch (PSO) and an optimisation algorithm.
+
+    The population has a slot per particle. tell(indices, ...) reports the fitness of the last positions
+    of those slots and ask(indices, best) proposes their next positions. In synchronous mode every slot is
+    told and asked at once, in asynchronous mode a single slot at a time, so an algorithm has to accept any
+    subset of the slots. Lower fitness is better.
+    """
+    name = None
+
+    def __init__(self, nr_slots : int, space : ParameterSpace = DEFAULT_SPACE, seed = None):
+        self.space = space
+        self.rng = np.random.default_rng(seed)
+        self.positions = space.clip(self.initial_positions(nr_slots))
+        # the best position of every slot, compared on the runs both have answered (see pairing)
+        self.best_positions = self.positions.copy()
+        self.best_values = np.full(nr_slots, np.inf)
+        self.best_answers = [{} for _ in range(nr_slots)]
+
+    def __len__(self):
+        return self.positions.shape[0]
+
+    def initial_positions(self, nr_slots):
+        return self.space.sample(nr_slots, self.rng)
+
+    def propose(self, indices, best):
+        """ the next positions of the slots indices as an array, best is the position of the global best """
+        raise NotImplementedError
+
+    def get_positions(self, indices = None):
+        positions = self.positions if indices is None else self.positions[indices]
+        return [self.space.to_dict(position) for position in positions]
+
+    def tell(self, indices, fitness : list, answers : list):
+        """ fitness and answers by run id of the last positions of the slots indices """
+        for index, value, run_answers in zip(indices, fitness, answers):
+            if pairing.is_better(run_answers, value, self.best_answers[index], self.best_values[index]):
+                self.best_positions[index] = self.positions[index]
+                self.best_values[index] = value
+                self.best_answers[index] = run_answers
+
+    def ask(self, indices, best : dict = None):
+        """ the next positions of the slots indices as dicts, best is the global best of the study (with migrants) """
+        indices = np.asarray(list(indices), dtype=int)
+        best = self.space.from_dict(best) if best is not None else self.best_positions[np.argmin(self.best_values)]
+        self.positions[indices] = self.space.clip(self.propose(indices, best))
+        return self.get_positions(indices)
+
+    def adopt(self, position : dict, value : float, answers : dict):
+        """ a migrant of another island (see island.MigrationChannel), that reaches the algorithm as best in the next asks """
+        return
+
+    def get_snapshot(self):
+        return {
+            "name": self.name,
+            "rng": self.rng.bit_generator.state,
+            "positions": self.positions.tolist(),
+            "best_positions": self.best_positions.tolist(),
+            "best_values": self.best_values.tolist(),
+            "best_answers": [list(answers.items()) for answers in self.best_answers]
+        }
+
+    def restore_snapshot(self, snapshot : dict):
+        self.rng.bit_generator.state = snapshot["rng"]
+        self.positions = np.array(snapshot["positions"], dtype=float)
+        self.best_positions = np.array(snapshot["best_positions"], dtype=float)
+        self.best_values = np.array(snapshot["best_values"], dtype=float)
+        self.best_answers = [dict(answers) for answers in snapshot["best_answers"]]
+
+class ParticleSwarm(Optimizer):
+    """ the particle swarm of the server, the best position of a slot is the personal best of its particle """
+    name = "pso"
+    PSO_W = -0.1832 # PSO Parameters
+    PSO_PW = 0.5287
+    PSO_NW = 3.1913
+
+    def __init__(self, nr_slots : int, space : ParameterSpace = DEFAULT_SPACE, seed = None):
+        Optimizer.__init__(self, nr_slots, space, seed)
+        # Initialize velocities based on a uniform distribution in [-0.5 * value, 0.5 * value]
+        self.velocities = 0.5 * self.rng.uniform(-1, 1, size=self.positions.shape) * self.positions
+        self.velocities[:, space.fixed] = 0
+        # the update is added to the old velocity (an inertia of 1 + PSO_W), except for p_c
+        self.inertia = np.where(np.array(space.names) == "p_c", self.PSO_W, 1 + self.PSO_W)
+
+    def initial_positions(self, nr_slots):
+        # all particles start at the same, randomly scaled position
+        scale = max(min(1.3, self.rng.random() * 2), 0.7)
+        start = self.space.from_dict({"rw_mean": scale * 4000, "rw_variance": scale * 2000, "tao": scale * 1500,
+                                      "u_plus": 0, "p_c": 0.95, "fill_ratio": self.space.upper[self.space.names.index("fill_ratio")]})
+        return np.tile(start, (nr_slots, 1))
+
+    def propose(self, indices, best):
+        positions = self.positions[indices]
+        r1 = self.rng.random(positions.shape)
+        r2 = self.rng.random(positions.shape)
+        velocities = self.inertia * self.velocities[indices]
+        velocities += self.PSO_PW * r1 * (self.best_positions[indices] - positions)
+        velocities += self.PSO_NW * r2 * (best - positions)
+        velocities[:, self.space.fixed] = 0
+        self.velocities[indices] = velocities
+        return positions + velocities
+
+    def get_snapshot(self):
+        return Optimizer.get_snapshot(self) | {"velocities": self.velocities.tolist()}
+
+    def restore_snapshot(self, snapshot : dict):
+        Optimizer.restore_snapshot(self, snapshot)
+        self.velocities = np.array(snapshot["velocities"], dtype=float)
+
+class DifferentialEvolution(Optimizer):
+    """
+    DE/rand/1/bin: the best position of a slot is its target vector and every ask proposes a trial vector,
+    that replaces the target when it turns out better. The first generation is a uniform sample of the space.
+    """
+    name = "de"
+    F = 0.5 # differential weight
+    CR = 0.9 # crossover probability
+
+    def __init__(self, nr_slots : int, space : ParameterSpace = DEFAULT_SPACE, seed = None):
+        if nr_slots < 4:
+            raise ValueError("differential evolution needs at least 4 particles")
+        Optimizer.__init__(self, nr_slots, space, seed)
+        self.free = np.flatnonzero(~space.fixed)
+
+    def propose(self, indices, best):
+        # three distinct other targets per slot: the first three of a random order without the slot itself
+        order = self.rng.random((len(indices), len(self)))
+        order[np.arange(len(indices)), indices] = np.inf
+        r1, r2, r3 = np.argsort(order, axis=1)[:, :3].T
+        mutants = self.best_positions[r1] + self.F * (self.best_positions[r2] - self.best_positions[r3])
+
+        # binomial crossover, at least one free parameter comes from the mutant
+        crossover = self.rng.random(mutants.shape) < self.CR
+        crossover[np.arange(len(indices)), self.rng.choice(self.free, size=len(indices))] = True
+        return np.where(crossover, mutants, self.best_positions[indices])
+
+    def adopt(self, position : dict, value : float, answers : dict):
+        # rand/1 ignores the global best, so the migrant replaces the worst target
+        worst = int(np.argmax(self.best_values))
+        self.best_positions[worst] = self.space.clip(self.space.from_dict(position))
+        self.best_values[worst] = value
+        self.best_answers[worst] = dict(answers)
+
+class CMAES(Optimizer):
+    """
+    (mu/mu_w, lambda)-CMA-ES on the free parameters scaled to [0, 1], lambda is the number of slots.
+    The distribution is updated as soon as lambda positions have been told, asks in between sample
+    the current distribution. The first generation is a uniform sample of the space.
+    """
+    name = "cmaes"
+    sigma0 = 0.3 # initial step size, relative to the bounds
+
+    def __init__(self, nr_slots : int, space : ParameterSpace = DEFAULT_SPACE, seed = None):
+        Optimizer.__init__(self, nr_slots, space, seed)
+        self.free = ~space.fixed
+        self.scale = space.upper[self.free] - space.lower[self.free]
+        n = int(self.free.sum())
+
+        # strategy parameters of the default CMA-ES
+        self.nr_parents = max(1, nr_slots // 2)
+        weights = math.log(self.nr_parents + 0.5) - np.log(np.arange(1, self.nr_parents + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / (self.weights ** 2).sum()
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0, math.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n * n))
+
+        self.mean = np.full(n, 0.5)
+        self.sigma = self.sigma0
+        self.covariance = np.eye(n)
+        self.ps = np.zeros(n)
+        self.pc = np.zeros(n)
+        self.nr_updates = 0
+        # told positions (scaled) and their fitness since the last update
+        self.told = []
+        self.__decompose()
+
+    def __decompose(self):
+        eigenvalues, self.eigenvectors = np.linalg.eigh(self.covariance)
+        self.stds = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+    def __to_unit(self, positions):
+        return (positions[:, self.free] - self.space.lower[self.free]) / self.scale
+
+    def propose(self, indices, best):
+        z = self.rng.standard_normal((len(indices), len(self.mean)))
+        samples = self.mean + self.sigma * (z * self.stds) @ self.eigenvectors.T
+        positions = np.tile(self.space.lower, (len(indices), 1))
+        positions[:, self.free] = self.space.lower[self.free] + np.clip(samples, 0, 1) * self.scale
+        return positions
+
+    def tell(self, indices, fitness : list, answers : list):
+        Optimizer.tell(self, indices, fitness, answers)
+        for index, value in zip(indices, fitness):
+            self.told.append((self.positions[index].copy(), value))
+            if len(self.told) == len(self):
+                self.__update()
+
+    def adopt(self, position : dict, value : float, answers : dict):
+        # the migrant is ranked with the told positions in the next update of the distribution
+        self.told.append((self.space.clip(self.space.from_dict(position)), value))
+        if len(self.told) == len(self):
+            self.__update()
+
+    def __update(self):
+        positions = np.array([position for position, _ in self.told])
+        fitness = np.array([value for _, value in self.told])
+        self.told = []
+        parents = self.__to_unit(positions[np.argsort(fitness)[:self.nr_parents]])
+
+        steps = (parents - self.mean) / self.sigma
+        step = self.weights @ steps
+        self.mean = self.mean + self.sigma * step
+
+        # evolution paths
+        inverse_sqrt = self.eigenvectors @ np.diag(1 / self.stds) @ self.eigenvectors.T
+        self.ps = (1 - self.cs) * self.ps + math.sqrt(self.cs * (2 - self.cs) * self.mueff) * (inverse_sqrt @ step)
+        self.nr_updates += 1
+        ps_norm = np.linalg.norm(self.ps)
+        hsig = ps_norm / math.sqrt(1 - (1 - self.cs) ** (2 * self.nr_updates)) / self.chi_n < 1.4 + 2 / (len(self.mean) + 1)
+        self.pc = (1 - self.cc) * self.pc + hsig * math.sqrt(self.cc * (2 - self.cc) * self.mueff) * step
+
+        # rank-one and rank-mu update of the covariance, then the step size
+        self.covariance = ((1 - self.c1 - self.cmu) * self.covariance
+                           + self.c1 * (np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.covariance)
+                           + self.cmu * (steps.T * self.weights) @ steps)
+        self.covariance = (self.covariance + self.covariance.T) / 2
+        # the bounds are [0, 1], so a larger step size only samples the bounds
+        self.sigma = min(1.0, self.sigma * math.exp((self.cs / self.damps) * (ps_norm / self.chi_n - 1)))
+        self.__decompose()
+
+    def get_snapshot(self):
+        return Optimizer.get_snapshot(self) | {
+            "mean": self.mean.tolist(),
+            "sigma": self.sigma,
+            "covariance": self.covariance.tolist(),
+            "ps": self.ps.tolist(),
+            "pc": self.pc.tolist(),
+            "nr_updates": self.nr_updates,
+            "told": [[position.tolist(), value] for position, value in self.told]
+        }
+
+    def restore_snapshot(self, snapshot : dict):
+        Optimizer.restore_snapshot(self, snapshot)
+        self.mean = np.array(snapshot["mean"], dtype=float)
+        self.sigma = snapshot["sigma"]
+        self.covariance = np.array(snapshot["covariance"], dtype=float)
+        self.ps = np.array(snapshot["ps"], dtype=float)
+        self.pc = np.array(snapshot["pc"], dtype=float)
+        self.nr_updates = snapshot["nr_updates"]
+        self.told = [(np.array(position, dtype=float), value) for position, value in snapshot["told"]]
+        self.__decompose()
+
+OPTIMIZERS = {optimizer.name: optimizer for optimizer in (ParticleSwarm, CMAES, DifferentialEvolution)}
+
+def create_optimizer(name : str, nr_slots : int, space : ParameterSpace = DEFAULT_SPACE, seed = None):
+    if name not in OPTIMIZERS:
+        raise ValueError("unknown optimizer: " + name + ", choose one of " + ", ".join(OPTIMIZERS))
+    return OPTIMIZERS[name](nr_slots, space, seed)
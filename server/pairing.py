@@ -0,0 +1,16 @@
+"""
+Common random numbers: run i of every particle is simulated in the world of seed i, so answers
+with the same run id are paired and a comparison only has to look at their differences.
+"""
+from statistics import mean
+
+def differences(answers : dict, reference : dict):
+    """ answer - reference answer for every run id that both have answered """
+    return [answer - reference[run_id] for run_id, answer in answers.items() if run_id in reference]
+
+def is_better(answers : dict, value : float, reference : dict, reference_value : float):
+    """ lower is better. Paired on the common runs, by the mean values when no run is in common """
+    paired = differences(answers, reference)
+    if paired:
+        return mean(paired) < 0
+    return value < reference_value
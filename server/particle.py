@@ -1,8 +1,12 @@
 from enum import Enum
 import json
-import random
 from particle_run import ParticleRun
+from racing import Decision, RacingPolicy
 from statistics import mean
+from log import get_logger
+import pairing
+
+logger = get_logger("particle")
 
 class Position:
     def __init__(self, rw_mean, rw_variance, tao, u_plus, p_c, fill_ratio):
@@ -33,137 +37,137 @@ class Position:
         }
         return self.values
 
-class ParticlePosition(Position):
-    def __init__(self, rw_mean, rw_variance, tao, u_plus, p_c, fill_ratio = 0.48):
-        Position.__init__(self, rw_mean, rw_variance, tao, u_plus, p_c, fill_ratio)
-        # Initialize velocities based on a Gaussian distribution
-        self.rw_mean_vel = self.__generate_variation(self.rw_mean)
-        self.rw_variance_vel = self.__generate_variation(self.rw_variance)
-        self.tao_vel = self.__generate_variation(self.tao)
-        self.u_plus_vel = self.__generate_variation(self.u_plus)
-        self.p_c_vel = self.__generate_variation(self.p_c)
-        self.fill_ratio_vel =  self.__generate_variation(self.fill_ratio)
-
-    def __generate_variation(self, value):
-        return 0.5 * random.uniform(-value, value)
-    
 class State(Enum):
     UNSOLVED = 1
     REQUESTED = 2
     SOLVED = 3
 
 class Particle:
+    """ a slot of the population: the runs of its current position, which the optimizer moves (see optimizer.Optimizer) """
+    nr_runs = 15 # runs per position
 
-    def __init__(self, id : int, rw_mean : float, rw_variance : float, tao : float, u_plus : float, p_c : float, fill_ratio = 0.48):
+    def __init__(self, id : int, position : dict):
         self.history_fitness = []
-        self.pos = ParticlePosition(rw_mean, rw_variance, tao, u_plus, p_c, fill_ratio) # position of this particle
-        self.pb = Position(rw_mean, rw_variance, tao, u_plus, p_c, fill_ratio) # personal best
+        self.pos = Position(**position) # position of this particle
         self.id = id
         self.current_fitness = float('inf')
+        # answers by run id, the runs of all particles share their seeds (see pairing)
+        self.current_answers = {}
         self.state = State.UNSOLVED
-        self.nr_runs = 15
         self.runs = [ParticleRun(i) for i in range(self.nr_runs)]
+        self.nr_solved_runs = 0
 
-
-    def request_parameters_JSON(self, generation : int):
-        """ this is called as a request to do a calculation. Returns a current run with its parameters and sets the states to REQUESTED"""
+    def request_run(self, run_id : int, generation : int):
+        """ this is called when a run of this particle is leased to a client. Returns the parameters of the run and sets the states to REQUESTED"""
         if self.state == State.UNSOLVED:
             self.state = State.REQUESTED
 
-        # return an unsolved run
-        for run in self.runs:
-            if run.is_unsolved():
-                run.set_state_to_in_progress()
-                return self.__return_parameters(generation, run.id)
-            
-        # all runs are (being) solved, so return a run that is already being requested
-        for run in self.runs:
-            if run.is_in_progress():
-                return self.__return_parameters(generation, run.id)
-            
-        # return an error instead
-        return "there is an error: all runs of this particle already have been calculated, but the state of this particle is not updated"
-        
+        run = self.runs[run_id]
+        if run.is_unsolved():
+            run.set_state_to_in_progress()
+        return self.get_parameters(generation, run_id)
+
+    def is_open(self, run_id : int):
+        """ a run is open as long as no answer has been accepted for it """
+        return self.state != State.SOLVED and 0 <= run_id < len(self.runs) and not self.runs[run_id].is_solved()
     
     def print_history(self):
         self.history_fitness.append(self.current_fitness)
-        print("Particle id = ", self.id, " with history ", *self.history_fitness)
+        logger.info("history", particle_id=self.id, history_fitness=self.history_fitness)
     
-    def update_fit_value(self, fit_val, run_id, gb : dict):
+    def update_fit_value(self, fit_val, run_id, solved_by = None, racing : RacingPolicy = None, g_best_value = float('inf'), g_best_answers = None,
+                         pb_value = float('inf'), pb_answers = None):
+        """
+        returns True if this answer completed this particle, with racing the particle can be completed early or get extra runs.
+        Racing compares the runs with the best of the slot of this particle (pb, see optimizer.Optimizer) and the global best.
+        """
         # TODO: rename to 'update_particle'
-        # check if particle is already solved
-        if not self.state == State.SOLVED:
-            # update the right run of this particle
-            for run in self.runs:
-                if run.id == run_id:
-                    # we have the right run, now update the fitness value
-                    run.update_fit_value(fit_val)
-                    break
+        # check if particle is already solved or the run does not exist
+        if self.state == State.SOLVED or not 0 <= run_id < len(self.runs):
+            return False
+
+        # update the right run of this particle
+        if not self.runs[run_id].update_fit_value(fit_val, solved_by):
+            return False
+        self.nr_solved_runs += 1
+
+        if racing is not None:
+            answers = self.get_answers_by_run()
+            decision = racing.decide(self.get_answers(), len(self.runs), pb_value, g_best_value,
+                                     pairing.differences(answers, pb_answers or {}), pairing.differences(answers, g_best_answers or {}))
+            if decision == Decision.STOP:
+                logger.debug("stopped early", particle_id=self.id, nr_solved_runs=self.nr_solved_runs)
+                self.complete()
+                return True
+            if decision == Decision.EXTEND:
+                for _ in range(racing.extend(len(self.runs))):
+                    self.runs.append(ParticleRun(len(self.runs)))
+                return False
             
-            # check if all runs have been solved
-            if self.__all_runs_have_been_calculated():
-                print("done for particle with id: ", self.id)
-                # update fitness value this particle
-                self.current_fitness = self.__get_avg_fitness_value()
-
-                # set state of this particle to be solved
-                self.state == State.SOLVED
-
-                # update personal best if applied
-                if fit_val < self.current_fitness:
-                    self.pb = Position(self.pos.rw_mean, self.pos.rw_variance, self.pos.tao, self.pos.u_plus, self.pos.p_c, self.pos.fill_ratio)
-                
-                #update velocity
-                self.pos.rw_mean_vel += self.__update_variable(self.pos.rw_mean_vel, self.pos.rw_mean, self.pb.rw_mean, gb["rw_mean"])
-                self.pos.rw_variance_vel += self.__update_variable(self.pos.rw_variance_vel, self.pos.rw_variance, self.pb.rw_variance, gb["rw_variance"])
-                self.pos.tao_vel += self.__update_variable(self.pos.tao_vel, self.pos.tao, self.pb.tao, gb["tao"])
-                self.pos.u_plus_vel += self.__update_variable(self.pos.u_plus_vel, self.pos.u_plus, self.pb.u_plus, gb["u_plus"])
-                self.pos.p_c_vel = self.__update_variable(self.pos.p_c_vel, self.pos.p_c, self.pb.p_c, gb["p_c"])
-                self.pos.fill_ratio_vel += self.__update_variable(self.pos.fill_ratio_vel, self.pos.fill_ratio, self.pb.fill_ratio, gb["fill_ratio"])
-                
-                # set fitness value to up to date
-                self.state = State.SOLVED
-
-    def reset(self):
-        # update position
+        # check if all runs have been solved
+        if self.__all_runs_have_been_calculated():
+            self.complete()
+            return True
+        return False
+
+    def complete(self):
+        """ compute the fitness from the solved runs, the optimizer keeps the best of every slot """
+        logger.debug("done", particle_id=self.id)
+        # update fitness value this particle
+        self.current_fitness = self.__get_avg_fitness_value()
+        self.current_answers = self.get_answers_by_run()
+
+        # set fitness value to up to date
+        self.state = State.SOLVED
+
+    def get_answers(self):
+        return [run.answer for run in self.runs if run.is_solved()]
+
+    def get_answers_by_run(self):
+        return {run.id: run.answer for run in self.runs if run.is_solved()}
+
+    def move(self, position : dict):
+        """ start evaluating the next position that the optimizer asked for """
         self.history_fitness.append(self.current_fitness)
-        self.pos.rw_mean += self.pos.rw_mean_vel
-        self.pos.rw_mean = max(1000, min(8000, self.pos.rw_mean))
-
-        # WARNING! VARIANCE IS NOT YET IMPLEMENTED IN CLIENT WEBOTS!
-        self.pos.rw_variance += self.pos.rw_variance_vel
-        self.pos.rw_variance = max(0, min(4000, self.pos.rw_variance))
-
-        self.pos.tao += self.pos.tao_vel
-        self.pos.tao = max(1000, min(3000, self.pos.tao))
-
-        self.pos.p_c += self.pos.p_c_vel
-        self.pos.p_c = max(0.85, min(0.99, self.pos.p_c))
+        self.pos = Position(**position)
 
         # set new value to be not up to date
         self.state = State.UNSOLVED
         self.runs = [ParticleRun(i) for i in range(self.nr_runs)]
+        self.nr_solved_runs = 0
+
+    def plan_runs(self, nr_runs : int):
+        """ evaluate the new position with nr_runs runs instead of self.nr_runs, before any run is handed out """
+        self.runs = [ParticleRun(i) for i in range(nr_runs)]
+
+    def get_snapshot(self):
+        """ the complete state of this particle as a JSON serializable dict """
+        return {
+            "id": self.id,
+            "pos": self.pos.get_values(),
+            "current_fitness": self.current_fitness,
+            "current_answers": list(self.current_answers.items()),
+            "history_fitness": self.history_fitness,
+            "state": self.state.value,
+            "runs": [run.get_snapshot() for run in self.runs]
+        }
 
-    def __return_parameters(self, generation, run_id):
-        return json.dumps({"particle_id": self.id, "generation": generation, "run_id": run_id} | self.pos.get_values())
+    def restore_snapshot(self, snapshot : dict):
+        self.pos = Position(**snapshot["pos"])
+        self.current_fitness = snapshot["current_fitness"]
+        # JSON has no integer keys, so the answers are stored as [run id, answer] pairs
+        self.current_answers = dict(snapshot.get("current_answers", []))
+        self.history_fitness = list(snapshot["history_fitness"])
+        self.state = State(snapshot["state"])
+        self.runs = [ParticleRun.from_snapshot(run) for run in snapshot["runs"]]
+        self.nr_solved_runs = sum(1 for run in self.runs if run.is_solved())
+
+    def get_parameters(self, generation, run_id):
+        return {"particle_id": self.id, "generation": generation, "run_id": run_id} | self.pos.get_values()
     
     def __get_avg_fitness_value(self):
-        run_values = []
-        for run in self.runs:
-            run_values.append(run.answer)
-        return mean(run_values)
+        # with racing, a particle can be completed before all of its runs are solved
+        return mean(self.get_answers())
     
     def __all_runs_have_been_calculated(self):
-        for run in self.runs:
-            if not run.is_solved():
-                return False
-        return True
-    
-    def __update_variable(self, old_vel, old_value, personal_best, global_best):
-        PSO_W = -0.1832 # PSO Parameters
-        PSO_PW = 0.5287
-        PSO_NW = 3.1913
-
-        r1 = random.random()
-        r2 = random.random()
-        return PSO_W * old_vel + PSO_PW * r1 * (personal_best - old_value) + PSO_NW * r2 * (global_best - old_value)
\ No newline at end of file
+        return self.nr_solved_runs == len(self.runs)
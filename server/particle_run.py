@@ -1,4 +1,6 @@
+from log import get_logger
 
+logger = get_logger("particle_run")
 
 class RunState:
     UNSOLVED = 0
@@ -12,6 +14,18 @@ class ParticleRun:
         self.answer = None
         self.solved_by = None
 
+    @staticmethod
+    def from_snapshot(snapshot : dict):
+        run = ParticleRun(snapshot["id"])
+        run.answer = snapshot["answer"]
+        run.solved_by = snapshot["solved_by"]
+        # runs that were in progress are handed out again unless their lease is restored
+        run.state = RunState.SOLVED if snapshot["solved"] else RunState.UNSOLVED
+        return run
+
+    def get_snapshot(self):
+        return {"id": self.id, "answer": self.answer, "solved_by": self.solved_by, "solved": self.is_solved()}
+
     def is_unsolved(self):
         if self.state == RunState.UNSOLVED:
             return True
@@ -23,12 +37,16 @@ class ParticleRun:
     def is_solved(self):
         return self.state == RunState.SOLVED
     
-    def update_fit_value(self, fit_val):
+    def update_fit_value(self, fit_val, solved_by = None):
+        """ returns True if the answer was accepted, False if this run was already solved """
         # check if particle is already solved
         if self.state != RunState.SOLVED:
             self.answer = fit_val
+            self.solved_by = solved_by
             self.state = RunState.SOLVED
-            print("particle run with id ", self.id, " updated with value ", self.answer)
+            logger.debug("updated", run_id=self.id, answer=self.answer)
+            return True
+        return False
 
     def set_state_to_in_progress(self):
         self.state = RunState.IN_PROGRESS
\ No newline at end of file
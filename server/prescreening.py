@@ -0,0 +1,121 @@
+import math
+
+import numpy as np
+from swarm import DEFAULT_SPACE, ParameterSpace
+
+class GaussianProcess:
+    """
+    Gaussian-process regression of the fitness over the parameter space, with an RBF kernel on the
+    positions scaled to [0, 1] per dimension. Every completed particle is an observation of the mean
+    fitness of its runs, with a noise that shrinks with the number of runs. The model is refitted
+    lazily on the next prediction and keeps the last max_points observations.
+    """
+    def __init__(self, space : ParameterSpace = DEFAULT_SPACE, length_scale = 0.3, noise = 0.2, max_points = 300):
+        self.space = space
+        self.free = ~space.fixed
+        self.length_scale = length_scale
+        self.noise = noise # variance of a single run, relative to the variance of the fitness
+        self.max_points = max_points
+        self.positions = []
+        self.values = []
+        self.nr_runs = []
+        self.fitted = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __scale(self, positions):
+        positions = np.atleast_2d(np.asarray(positions, dtype=float))[:, self.free]
+        return (positions - self.space.lower[self.free]) / (self.space.upper[self.free] - self.space.lower[self.free])
+
+    def __kernel(self, a, b):
+        distances = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+        return np.exp(-0.5 * distances / self.length_scale ** 2)
+
+    def observe(self, values : dict, fitness : float, nr_runs = 1):
+        if not math.isfinite(fitness):
+            return
+        self.positions.append(self.space.from_dict(values))
+        self.values.append(fitness)
+        self.nr_runs.append(max(1, nr_runs))
+        if len(self.values) > self.max_points:
+            del self.positions[0], self.values[0], self.nr_runs[0]
+        self.fitted = None
+
+    def get_snapshot(self):
+        return {
+            "positions": [position.tolist() for position in self.positions],
+            "values": list(self.values),
+            "nr_runs": list(self.nr_runs)
+        }
+
+    def restore_snapshot(self, snapshot : dict):
+        self.positions = [np.array(position, dtype=float) for position in snapshot["positions"]]
+        self.values = list(snapshot["values"])
+        self.nr_runs = list(snapshot["nr_runs"])
+        self.fitted = None
+
+    def __fit(self):
+        x = self.__scale(self.positions)
+        y = np.asarray(self.values)
+        y_mean = y.mean()
+        y_std = y.std() if y.std() > 0 else 1.0
+        covariance = self.__kernel(x, x) + np.diag(self.noise / np.asarray(self.nr_runs, dtype=float)) + 1e-9 * np.eye(len(y))
+        cholesky = np.linalg.cholesky(covariance)
+        alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, (y - y_mean) / y_std))
+        self.fitted = (x, cholesky, alpha, y_mean, y_std)
+
+    def predict(self, positions : list):
+        """ mean and standard deviation of the fitness of every position dict """
+        if self.fitted is None:
+            self.__fit()
+        x, cholesky, alpha, y_mean, y_std = self.fitted
+        k = self.__kernel(self.__scale([self.space.from_dict(values) for values in positions]), x)
+        mean = y_mean + y_std * (k @ alpha)
+        v = np.linalg.solve(cholesky, k.T)
+        variance = np.maximum(1.0 - (v * v).sum(axis=0), 0.0)
+        return mean, y_std * np.sqrt(variance)
+
+class Prescreening:
+    """
+    Spends the simulations of a generation on the promising positions. Once the model has min_points
+    observations, a new position gets all nr_runs runs when its lower confidence bound
+    (mean - kappa * std, so uncertain positions count as promising too) is among the best full_fraction
+    of the swarm, and only reduced_runs runs otherwise. Lower fitness is better.
+    """
+    def __init__(self, model : GaussianProcess = None, min_points = 10, full_fraction = 0.4, kappa = 1.0, reduced_runs = 5):
+        self.model = model if model is not None else GaussianProcess()
+        self.min_points = min_points
+        self.full_fraction = full_fraction
+        self.kappa = kappa
+        self.reduced_runs = reduced_runs
+        self.nr_saved_runs = 0
+
+    def observe(self, values : dict, fitness : float, nr_runs : int):
+        self.model.observe(values, fitness, nr_runs)
+
+    def plan(self, candidates : list, swarm : list, nr_runs : int):
+        """
+        the number of runs and the predicted fitness (None before the model is ready) of every candidate
+        position, ranked against the positions of the whole swarm
+        """
+        if len(self.model) < self.min_points:
+            return [(nr_runs, None) for _ in candidates]
+
+        mean, std = self.model.predict(swarm)
+        bounds = mean - self.kappa * std
+        threshold = np.quantile(bounds, self.full_fraction)
+        mean, std = self.model.predict(candidates)
+        plans = []
+        for predicted, bound in zip(mean, mean - self.kappa * std):
+            runs = nr_runs if bound <= threshold else min(nr_runs, self.reduced_runs)
+            self.nr_saved_runs += nr_runs - runs
+            plans.append((runs, float(predicted)))
+        return plans
+
+    def get_snapshot(self):
+        return {"model": self.model.get_snapshot(), "nr_saved_runs": self.nr_saved_runs}
+
+    def restore_snapshot(self, snapshot : dict):
+        self.model.restore_snapshot(snapshot["model"])
+        self.nr_saved_runs = snapshot["nr_saved_runs"]
@@ -0,0 +1,76 @@
+import math
+from enum import Enum
+from statistics import mean, stdev
+
+class Decision(Enum):
+    CONTINUE = 1 # keep evaluating the planned runs
+    STOP = 2 # the particle cannot beat its personal best, stop evaluating it
+    EXTEND = 3 # the particle is a close contender of the global best, add runs (see RacingPolicy.extend)
+
+class RacingPolicy:
+    """
+    Adaptive run allocation. After min_runs answers a particle is stopped early when the lower bound of
+    the confidence interval of its mean fitness is worse than its personal best (and so worse than the
+    global best as well). A particle whose confidence interval still contains the global best when its
+    planned runs are done gets batch_size extra runs at once, up to max_runs, as long as the budget of the generation lasts.
+
+    When the runs are paired with those of the personal or global best (common random numbers), the
+    intervals are those of the paired differences, which are much narrower than those of the answers.
+    """
+    def __init__(self, min_runs = 5, max_runs = 25, z = 1.96, budget = 30, batch_size = 5):
+        self.min_runs = min_runs
+        self.max_runs = max_runs
+        self.z = z
+        self.budget = budget # extra runs per generation
+        self.batch_size = batch_size # extra runs per extension
+        self.nr_extra_runs = 0
+        self.nr_stopped_runs = 0
+
+    def new_generation(self):
+        self.nr_extra_runs = 0
+
+    def decide(self, answers : list, nr_planned : int, pb_value : float, g_best_value : float, pb_differences : list = None, g_best_differences : list = None):
+        n = len(answers)
+        if n < max(self.min_runs, 2):
+            return Decision.CONTINUE
+
+        half_width = self.z * stdev(answers) / math.sqrt(n)
+        avg = mean(answers)
+        if self.__is_paired(pb_differences):
+            worse = self.__interval(pb_differences)[0] > 0
+        else:
+            worse = avg - half_width > max(pb_value, g_best_value)
+        if worse:
+            self.nr_stopped_runs += nr_planned - n
+            return Decision.STOP
+
+        if self.__is_paired(g_best_differences):
+            low, high = self.__interval(g_best_differences)
+            close = low <= 0 <= high
+        else:
+            close = abs(avg - g_best_value) <= half_width
+        if n == nr_planned and nr_planned < self.max_runs and self.nr_extra_runs < self.budget and close:
+            return Decision.EXTEND
+        return Decision.CONTINUE
+
+    def extend(self, nr_planned : int):
+        """ the number of extra runs of an EXTEND decision, they are taken from the budget of the generation """
+        nr_runs = min(self.batch_size, self.max_runs - nr_planned, self.budget - self.nr_extra_runs)
+        self.nr_extra_runs += nr_runs
+        return nr_runs
+
+    def get_snapshot(self):
+        return {"nr_extra_runs": self.nr_extra_runs, "nr_stopped_runs": self.nr_stopped_runs}
+
+    def restore_snapshot(self, snapshot : dict):
+        self.nr_extra_runs = snapshot["nr_extra_runs"]
+        self.nr_stopped_runs = snapshot["nr_stopped_runs"]
+
+    def __is_paired(self, differences):
+        return differences is not None and len(differences) >= max(self.min_runs, 2)
+
+    def __interval(self, differences):
+        """ confidence interval of the mean paired difference """
+        half_width = self.z * stdev(differences) / math.sqrt(len(differences))
+        avg = mean(differences)
+        return avg - half_width, avg + half_width
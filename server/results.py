@@ -0,0 +1,190 @@
+import atexit
+import glob
+import math
+import os
+import threading
+
+import numpy as np
+
+class ResultStore:
+    """
+    Every accepted answer of a study as a row of a columnar store.
+
+    Rows are collected in memory until chunk_size rows are buffered and are then written as one
+    .npz file with an array per column, so the memory of the server stays bounded however long
+    the study runs. Queries scan the chunks one by one and aggregate on the fly. The buffer is part
+    of the journal snapshot of the study (get_snapshot), so a crash does not lose it.
+    """
+    numeric_columns = ("time", "particle_id", "generation", "run_id", "seed", "answer", "duration",
+                       "rw_mean", "rw_variance", "tao", "u_plus", "p_c", "fill_ratio")
+    columns = numeric_columns + ("client",)
+    group_columns = ("particle_id", "generation", "run_id", "seed", "client")
+
+    def __init__(self, directory : str, chunk_size = 4096):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.chunks = sorted(glob.glob(os.path.join(directory, "chunk_*.npz")))
+        self.buffer = {column: [] for column in self.columns}
+        self.nr_flushed = sum(self.__chunk_length(path) for path in self.chunks) # rows in the chunks
+        # appended rows that are already in a chunk, see restore_snapshot
+        self.nr_skipped = 0
+        # the rows of a partial chunk are written when the server exits
+        atexit.register(self.flush)
+
+    @staticmethod
+    def __chunk_length(path):
+        with np.load(path) as chunk:
+            return len(chunk["answer"])
+
+    def get_snapshot(self):
+        with self.lock:
+            return {"nr_flushed": self.nr_flushed, "buffer": {column: list(values) for column, values in self.buffer.items()}}
+
+    def restore_snapshot(self, snapshot : dict):
+        """
+        continue from the snapshot of a previous run. The rows that were buffered at the snapshot come back in the buffer,
+        unless a chunk was written after the snapshot: then that chunk holds them and the first answers that the restart
+        replays from the journal, which are skipped.
+        """
+        with self.lock:
+            nr_written = self.nr_flushed - snapshot["nr_flushed"]
+            self.buffer = {column: list(snapshot["buffer"][column][nr_written:]) for column in self.columns}
+            self.nr_skipped = max(0, nr_written - len(snapshot["buffer"]["answer"]))
+
+    def append(self, row : dict):
+        """ row has a value for every column, missing values are stored as NaN (or "" for the client) """
+        with self.lock:
+            if self.nr_skipped > 0:
+                self.nr_skipped -= 1
+                return
+            for column in self.numeric_columns:
+                value = row.get(column)
+                self.buffer[column].append(math.nan if value is None else float(value))
+            self.buffer["client"].append("" if row.get("client") is None else str(row["client"]))
+            if len(self.buffer["answer"]) >= self.chunk_size:
+                self.__write_chunk()
+
+    def flush(self):
+        with self.lock:
+            if self.buffer["answer"]:
+                self.__write_chunk()
+
+    def __write_chunk(self):
+        path = os.path.join(self.directory, "chunk_%06d.npz" % len(self.chunks))
+        arrays = {column: np.asarray(values, dtype=np.float64) for column, values in self.buffer.items() if column != "client"}
+        arrays["client"] = np.asarray(self.buffer["client"], dtype=str)
+        # write to a temporary file first, so a crash never leaves a half written chunk
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(tmp_path, path)
+        self.chunks.append(path)
+        self.nr_flushed += len(self.buffer["answer"])
+        self.buffer = {column: [] for column in self.columns}
+
+    def __iterate_chunks(self):
+        """ the flushed chunks and a copy of the buffer, as dicts of column arrays """
+        with self.lock:
+            chunks = list(self.chunks)
+            buffer = {column: list(values) for column, values in self.buffer.items()}
+        for path in chunks:
+            with np.load(path) as chunk:
+                yield {column: chunk[column] for column in self.columns}
+        if buffer["answer"]:
+            arrays = {column: np.asarray(values, dtype=np.float64) for column, values in buffer.items() if column != "client"}
+            arrays["client"] = np.asarray(buffer["client"], dtype=str)
+            yield arrays
+
+    @classmethod
+    def __select(cls, chunk, filters):
+        mask = np.ones(len(chunk["answer"]), dtype=bool)
+        for column, value in filters.items():
+            if column.startswith("min_"):
+                mask &= chunk[column[4:]] >= value
+            elif column.startswith("max_"):
+                mask &= chunk[column[4:]] <= value
+            else:
+                mask &= chunk[column] == value
+        return mask
+
+    def query(self, filters : dict = None, group_by : str = None, limit = 1000):
+        """
+        rows that match filters ({column: value}, {"min_<column>": value} or {"max_<column>": value}).
+        With group_by (one of group_columns) the rows are aggregated per group instead:
+        count, mean, std, min and max of the answer and the mean duration.
+        """
+        filters = dict(filters or {})
+        for column, value in filters.items():
+            name = column[4:] if column.startswith(("min_", "max_")) else column
+            if name not in self.columns:
+                raise ValueError("unknown column: " + column)
+            if name == "client":
+                if column != name:
+                    raise ValueError("the client column has no range: " + column)
+                filters[column] = str(value)
+                continue
+            try:
+                filters[column] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError("not a number: " + column + "=" + str(value))
+        if group_by is not None and group_by not in self.group_columns:
+            raise ValueError("cannot group by: " + group_by)
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+            raise ValueError("limit must be a positive integer, not " + str(limit))
+
+        if group_by is None:
+            return self.__rows(filters, limit)
+        return self.__aggregate(filters, group_by)
+
+    def __rows(self, filters, limit):
+        rows = []
+        for chunk in self.__iterate_chunks():
+            indices = np.flatnonzero(self.__select(chunk, filters))[:limit - len(rows)]
+            for index in indices:
+                rows.append({column: self.__value(chunk[column][index]) for column in self.columns})
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def __aggregate(self, filters, group_by):
+        # count, sum, sum of squares, min, max of the answer and the sum of the durations per group
+        groups = {}
+        for chunk in self.__iterate_chunks():
+            mask = self.__select(chunk, filters)
+            keys = chunk[group_by][mask]
+            answers = chunk["answer"][mask]
+            durations = np.nan_to_num(chunk["duration"][mask])
+            for key in np.unique(keys):
+                selected = keys == key
+                values = answers[selected]
+                group = groups.setdefault(self.__value(key), [0, 0.0, 0.0, math.inf, -math.inf, 0.0])
+                group[0] += len(values)
+                group[1] += float(values.sum())
+                group[2] += float((values * values).sum())
+                group[3] = min(group[3], float(values.min()))
+                group[4] = max(group[4], float(values.max()))
+                group[5] += float(durations[selected].sum())
+
+        result = []
+        for key in sorted(groups):
+            count, total, squares, low, high, duration = groups[key]
+            avg = total / count
+            variance = max(0.0, (squares - count * avg * avg) / (count - 1)) if count > 1 else 0.0
+            result.append({group_by: key, "count": count, "mean": avg, "std": math.sqrt(variance),
+                           "min": low, "max": high, "mean_duration": duration / count})
+        return result
+
+    @staticmethod
+    def __value(value):
+        """ numpy scalars as JSON serializable values, whole numbers as int """
+        if isinstance(value, np.str_):
+            return str(value)
+        value = float(value)
+        if math.isnan(value):
+            return None
+        return int(value) if value.is_integer() else value
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,75 @@
+import asyncio
+import sys
+import zlib
+
+import aiohttp
+from aiohttp import web
+import encoding
+
+class Router:
+    """
+    Thin reverse proxy in front of the island shards of a study (see island.MigrationChannel).
+    A client always goes to the same shard, chosen by a hash of its client id, so its leases,
+    heartbeats and answers all reach the shard that handed out its runs. Bodies are forwarded
+    as they are, in JSON or msgpack.
+    """
+    forwarded = ("Content-Type", "Accept")
+
+    def __init__(self, shards : list):
+        self.shards = [shard.rstrip("/") for shard in shards]
+        self.session = None
+
+    def define_routes(self, app : web.Application):
+        app.on_startup.append(self.__start)
+        app.on_cleanup.append(self.__stop)
+        app.add_routes([
+            web.get('/status', self.send_status),
+            web.route('*', '/{path:.*}', self.forward)
+        ])
+
+    async def __start(self, app):
+        # long-polling shards park /compute for up to 30 seconds
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_read=120))
+
+    async def __stop(self, app):
+        await self.session.close()
+
+    def get_shard(self, client):
+        # crc32 instead of hash(), so every router process sends a client to the same shard
+        return self.shards[zlib.crc32(str(client).encode()) % len(self.shards)]
+
+    async def forward(self, request):
+        body = await request.read()
+        client = request.query.get("client_id")
+        if client is None and body:
+            try:
+                client = encoding.decode(body, request.content_type).get("client_id")
+            except (ValueError, AttributeError):
+                client = None
+        if client is None:
+            client = request.remote
+
+        headers = {name: request.headers[name] for name in self.forwarded if name in request.headers}
+        async with self.session.request(request.method, self.get_shard(client) + request.path_qs, data=body, headers=headers) as response:
+            return web.Response(body=await response.read(), status=response.status, headers={"Content-Type": response.headers.get("Content-Type", "text/plain")})
+
+    async def send_status(self, request):
+        """ the status of every shard """
+        async def status(shard):
+            try:
+                async with self.session.get(shard + "/status") as response:
+                    return await response.json()
+            except aiohttp.ClientError as error:
+                return {"error": str(error)}
+        statuses = await asyncio.gather(*(status(shard) for shard in self.shards))
+        return web.json_response({"shards": dict(zip(self.shards, statuses))})
+
+def create_app(shards : list):
+    app = web.Application()
+    Router(shards).define_routes(app)
+    return app
+
+if __name__ == '__main__':
+    # router.py [PORT] [SHARD URL] [SHARD URL] ..., e.g. router.py 5000 http://localhost:5001 http://localhost:5002
+    # every shard is a server started with the same PSO_MIGRATION directory and its own PSO_ISLAND id
+    web.run_app(create_app(sys.argv[2:]), port=int(sys.argv[1]))
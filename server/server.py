@@ -1,26 +1,121 @@
-from flask import Flask, request, jsonify
-from PSO import PSO
+import time
+from flask import Flask, Response, request, jsonify
+import encoding
+from PSO import PSO, Mode
+from config import create_pso
+from core import PSOCore
+from study import Study, StudyScheduler
+from log import get_logger
+import metrics
+
+logger = get_logger("server")
 
 class Application:
     pso : PSO
 
-    def __init__(self, app=None):
-        self.pso = PSO()
+    def __init__(self, app=None, mode=Mode.SYNC, journal_dir=None, racing=None, cache=None, studies=None):
+        if studies is None:
+            studies = [Study("default", create_pso(mode, journal_dir, racing, cache))]
+        self.scheduler = StudyScheduler(studies)
+        self.pso = self.scheduler.default_study.pso
+        # flask handles requests in several threads, only the core thread changes the studies
+        self.core = PSOCore(self.scheduler)
+        metrics.RUNS_IN_FLIGHT.set_function(lambda: sum(study.pso.dispatcher.nr_leased() for study in self.scheduler.studies.values()))
         if app is not None:
             self.define_routes(app)
 
+    @staticmethod
+    def __read():
+        """ the message of the request, JSON or msgpack depending on its content type """
+        return encoding.decode(request.get_data(), request.content_type)
+
+    @staticmethod
+    def __respond(message):
+        """ msgpack when the client accepts it, JSON otherwise. Encoding happens outside the core thread """
+        body, content_type = encoding.encode(message, request.headers.get("Accept"))
+        return Response(body, content_type=content_type)
+
     def define_routes(self, app):
         self.app = app
 
         # ROUTES
         @app.route('/compute', methods=['GET'])
         def send_computation_parameters():
-            # For demonstration purposes, let's assume the result is a dummy value
-            return self.pso.receive_random_particle_JSON()
+            # leases are held by the client id, fall back to the address of the client
+            client = request.args.get("client_id", request.remote_addr)
+            start = time.perf_counter()
+            resp = self.__respond(self.core.call(self.scheduler.receive_random_particle_message, client))
+            metrics.DISPATCH_LATENCY.observe(time.perf_counter() - start)
+            return resp
 
         @app.route('/submit', methods=["POST"])
         def get_submission():
-            resp = request.get_json()
-            self.pso.update_fitness_value(resp["particle_id"], resp["generation"], resp["run_id"], resp["answer"])
-            print("CLIENT: ", request.get_json())
-            return "Thank you :)"
\ No newline at end of file
+            resp = self.__read()
+            client = resp.get("client_id", request.remote_addr)
+            start = time.perf_counter()
+            accepted = self.core.call(self.scheduler.update_fitness_value, resp.get("study_id"), resp["particle_id"], resp["generation"], resp["run_id"], resp["answer"], client)
+            metrics.SUBMIT_LATENCY.observe(time.perf_counter() - start)
+            # runs of this client that another client answered first, like /submit_batch
+            return self.__respond({"accepted": accepted, "abort": self.core.call(self.scheduler.heartbeat, client)})
+
+        @app.route('/compute_batch', methods=['GET'])
+        def send_computation_parameters_batch():
+            # lease up to n runs in one round trip
+            client = request.args.get("client_id", request.remote_addr)
+            n = max(1, request.args.get("n", 1, type=int))
+            start = time.perf_counter()
+            resp = self.__respond(self.core.call(self.scheduler.receive_particles_message, n, client))
+            metrics.DISPATCH_LATENCY.observe(time.perf_counter() - start)
+            return resp
+
+        @app.route('/submit_batch', methods=["POST"])
+        def get_submission_batch():
+            resp = self.__read()
+            client = resp.get("client_id", request.remote_addr)
+            start = time.perf_counter()
+            accepted = self.core.call(self.scheduler.update_fitness_values, resp["results"], client)
+            metrics.SUBMIT_LATENCY.observe(time.perf_counter() - start)
+            logger.debug("batch submitted", client=client, nr_results=len(resp["results"]), nr_accepted=accepted)
+            # runs of this client that another client answered first
+            return self.__respond({"accepted": accepted, "abort": self.core.call(self.scheduler.heartbeat, client)})
+
+        @app.route('/heartbeat', methods=["POST"])
+        def get_heartbeat():
+            # clients report while they simulate, the response lists the runs they should abort
+            resp = self.__read()
+            client = resp.get("client_id", request.remote_addr)
+            return self.__respond({"abort": self.core.call(self.scheduler.heartbeat, client)})
+
+        @app.route('/status', methods=['GET'])
+        def send_status():
+            # served from the last published snapshot, without waiting for the core
+            return jsonify(self.core.get_status())
+
+        @app.route('/cache', methods=['GET'])
+        def send_cache_statistics():
+            study = self.scheduler.get_study(request.args.get("study_id"))
+            if study is None or study.pso.cache is None:
+                return jsonify({"enabled": False})
+            return jsonify({"enabled": True} | self.core.call(study.pso.cache.get_statistics))
+
+        @app.route('/studies', methods=['GET'])
+        def send_studies():
+            return jsonify(self.core.get_status()["studies"])
+
+        @app.route('/metrics', methods=['GET'])
+        def send_metrics():
+            return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+        @app.route('/history', methods=['GET'])
+        def send_history():
+            # /history?study_id=&generation=3&min_answer=100&group_by=particle_id&limit=100
+            study = self.scheduler.get_study(request.args.get("study_id"))
+            if study is None or study.pso.results is None:
+                return jsonify({"enabled": False})
+            filters = {name: value for name, value in request.args.items() if name not in ("study_id", "group_by", "limit")}
+            try:
+                # the store is read outside the core thread, it only locks to copy its buffer
+                history = study.pso.results.query(filters, request.args.get("group_by"), int(request.args.get("limit", 1000)))
+            except ValueError as error:
+                return jsonify({"error": str(error)}), 400
+            return jsonify({"enabled": True, "history": history})
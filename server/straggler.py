@@ -0,0 +1,29 @@
+from collections import deque
+
+class DurationTracker:
+    """
+    Sliding window of the observed run durations (lease to accepted answer).
+
+    A lease that is older than factor times the percentile of the window belongs to a straggler, and its
+    run can be leased a second time. Until min_samples durations are known nothing is a straggler.
+    """
+    def __init__(self, window = 200, percentile = 0.95, factor = 1.5, min_samples = 20):
+        self.durations = deque(maxlen=window)
+        self.percentile = percentile
+        self.factor = factor
+        self.min_samples = min_samples
+        self.cached_threshold = None
+
+    def observe(self, duration : float):
+        self.durations.append(duration)
+        self.cached_threshold = None
+
+    def threshold(self):
+        """ seconds after which a lease is a straggler, None while there are too few samples """
+        if len(self.durations) < self.min_samples:
+            return None
+        if self.cached_threshold is None:
+            durations = sorted(self.durations)
+            index = min(len(durations) - 1, int(self.percentile * len(durations)))
+            self.cached_threshold = self.factor * durations[index]
+        return self.cached_threshold
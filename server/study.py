@@ -0,0 +1,102 @@
+from PSO import PSO, COMPLETED
+from log import get_logger
+
+logger = get_logger("study")
+
+class Study:
+    """ an independent optimisation with its own PSO, served under its study id """
+    def __init__(self, id : str, pso : PSO, weight = 1.0):
+        self.id = id
+        self.pso = pso
+        pso.study_id = id
+        self.weight = weight
+        self.nr_served = 0 # runs handed out to clients
+
+    def get_pass(self):
+        return self.nr_served / self.weight
+
+class StudyScheduler:
+    """
+    Hosts several studies in one server. Every request is served by the study with the lowest number
+    of handed out runs relative to its weight (stride scheduling) that has an open run, so workers keep
+    busy with other studies while a study waits at its generation barrier.
+    """
+    def __init__(self, studies : list):
+        self.studies = {study.id: study for study in studies}
+        self.default_study = studies[0]
+
+    def get_study(self, id = None):
+        if id is None:
+            return self.default_study
+        return self.studies.get(id)
+
+    def is_completed(self):
+        return all(study.pso.is_completed() for study in self.studies.values())
+
+    def __retry_after(self):
+        return min(study.pso.retry_after for study in self.studies.values())
+
+    def receive_random_particle(self, client = None):
+        active = sorted([study for study in self.studies.values() if not study.pso.is_completed()], key=Study.get_pass)
+        # straggling runs are only leased again when no study has an unleased run
+        for speculate in (False, True):
+            for study in active:
+                parameters = study.pso.receive_random_particle(client, speculate)
+                if parameters is not None:
+                    study.nr_served += 1
+                    return parameters | {"study_id": study.id}
+        return None
+
+    def receive_random_particle_message(self, client = None):
+        """ the parameters of a leased run, {"wait": seconds} or the PSO completed string """
+        if self.is_completed():
+            return COMPLETED
+
+        parameters = self.receive_random_particle(client)
+        if parameters is None:
+            if self.is_completed():
+                return COMPLETED
+            return {"wait": self.__retry_after()}
+        return parameters
+
+    def receive_particles_message(self, n, client = None):
+        if self.is_completed():
+            return COMPLETED
+
+        runs = []
+        while len(runs) < n:
+            parameters = self.receive_random_particle(client)
+            if parameters is None:
+                break
+            runs.append(parameters)
+
+        if not runs and self.is_completed():
+            return COMPLETED
+        if not runs:
+            return {"wait": self.__retry_after()}
+        return {"runs": runs}
+
+    def update_fitness_value(self, study_id, id, generation, run_id, fit_val, client = None):
+        """ returns True if the answer was accepted by the study, answers without study id go to the default study """
+        study = self.get_study(study_id)
+        if study is None:
+            logger.warning("unknown study", study_id=study_id)
+            return False
+        return study.pso.update_fitness_value(id, generation, run_id, fit_val, client)
+
+    def heartbeat(self, client = None):
+        """ the runs client should abort, over all studies """
+        return [run | {"study_id": study.id} for study in self.studies.values() for run in study.pso.heartbeat(client)]
+
+    def update_fitness_values(self, results, client = None):
+        accepted = 0
+        for result in results:
+            if self.update_fitness_value(result.get("study_id"), result["particle_id"], result["generation"], result["run_id"], result["answer"], client):
+                accepted += 1
+        return accepted
+
+    def get_status(self):
+        return {
+            "completed": self.is_completed(),
+            "studies": {study.id: study.pso.get_status() | {"weight": study.weight, "served": study.nr_served} for study in self.studies.values()}
+        }
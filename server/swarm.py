@@ -0,0 +1,46 @@
+import numpy as np
+
+class Dimension:
+    """ a single parameter of the search space, a dimension with lower == upper stays fixed """
+    def __init__(self, name : str, lower : float, upper : float):
+        self.name = name
+        self.lower = lower
+        self.upper = upper
+
+class ParameterSpace:
+    def __init__(self, dimensions : list):
+        self.dimensions = dimensions
+        self.names = [dimension.name for dimension in dimensions]
+        self.lower = np.array([dimension.lower for dimension in dimensions], dtype=float)
+        self.upper = np.array([dimension.upper for dimension in dimensions], dtype=float)
+        self.fixed = self.lower == self.upper
+
+    def __len__(self):
+        return len(self.dimensions)
+
+    def sample(self, n, rng : np.random.Generator):
+        """ n uniformly distributed positions as a (n, n_dims) array """
+        return rng.uniform(self.lower, self.upper, size=(n, len(self)))
+
+    def clip(self, positions):
+        return np.clip(positions, self.lower, self.upper, out=positions)
+
+    def to_dict(self, position):
+        return {name: float(value) for name, value in zip(self.names, position)}
+
+    def from_dict(self, values : dict):
+        return np.array([values[name] for name in self.names], dtype=float)
+
+    def fix(self, name : str, value : float):
+        """ a copy of this space in which the dimension name stays at value """
+        return ParameterSpace([Dimension(dimension.name, value, value) if dimension.name == name else dimension for dimension in self.dimensions])
+
+# the bounds of the optimizers, u_plus and fill_ratio (set per study) do not move
+DEFAULT_SPACE = ParameterSpace([
+    Dimension("rw_mean", 1000, 8000),
+    Dimension("rw_variance", 0, 4000), # WARNING! VARIANCE IS NOT YET IMPLEMENTED IN CLIENT WEBOTS!
+    Dimension("tao", 1000, 3000),
+    Dimension("u_plus", 0, 0),
+    Dimension("p_c", 0.85, 0.99),
+    Dimension("fill_ratio", 0.48, 0.48)
+])
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the server and client are flat directories of modules (from particle import Particle), not packages
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "client"))
+sys.path.insert(0, os.path.join(ROOT, "server"))
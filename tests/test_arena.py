@@ -0,0 +1,21 @@
+import numpy as np
+from backends import SurrogateBackend
+from world_generation.ArenaGenerator import ArenaArchive, nr_filled_tiles
+
+def test_archive_round_trip(tmp_path):
+    archive = ArenaArchive.create(str(tmp_path / "arenas.npy"), 10, 0.48, shape=(6, 4), seed=1)
+    reopened = ArenaArchive(str(tmp_path / "arenas.npy"))
+    assert len(reopened) == 10 and reopened.fill_ratio == 0.48 and reopened.seed == 1
+    for i in range(len(archive)):
+        assert np.array_equal(archive.arena(i).bitmap(), archive[i])
+        assert np.array_equal(reopened[i], archive[i])
+        assert int(archive[i].sum()) == nr_filled_tiles(24, 0.48) == 12
+        assert archive.image(i).size == (500 // 6 * 6, 500 // 6 * 4)
+
+def test_surrogate_simulates_run_seed_in_the_arena_of_the_archive(tmp_path):
+    archive = ArenaArchive.create(str(tmp_path / "arenas.npy"), 4, 0.48, seed=2)
+    backend = SurrogateBackend(archive=archive)
+    run = {"rw_mean": 3000, "rw_variance": 1000, "tao": 1500, "u_plus": 0, "p_c": 0.95, "fill_ratio": 0.48}
+    assert np.array_equal(backend.arena(run | {"seed": 6}), archive[2])
+    # another fill ratio than the archive is drawn from the seed
+    assert int(backend.arena(run | {"seed": 6, "fill_ratio": 0.8}).sum()) == nr_filled_tiles(25, 0.8)
@@ -0,0 +1,25 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+from PSO import PSO
+import async_app
+
+def request_all(queries):
+    """ the status and JSON body of GET requests to a fresh asynchronous server """
+    async def run():
+        async with TestClient(TestServer(async_app.create_app(PSO(nr_particles=2, max_generations=1)))) as client:
+            responses = []
+            for query in queries:
+                response = await client.get(query)
+                responses.append((response.status, await response.json()))
+            return responses
+    return asyncio.run(run())
+
+def test_invalid_lease_parameters_are_rejected():
+    responses = request_all(["/compute?timeout=abc", "/compute?timeout=nan", "/compute_batch?n=x", "/compute_batch?n=3&timeout=0"])
+    assert [status for status, _ in responses] == [400, 400, 400, 200]
+    assert len(responses[-1][1]["runs"]) == 3
+
+def test_status_of_the_study():
+    [(status, body)] = request_all(["/status"])
+    assert status == 200 and body["nr_particles"] == 2 and not body["completed"]
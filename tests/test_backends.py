@@ -0,0 +1,48 @@
+import numpy as np
+from backends import FitnessBackend, SurrogateBackend, WebotsBackend
+
+RUN = {"rw_mean": 3000, "rw_variance": 1000, "tao": 1500, "u_plus": 0, "p_c": 0.95, "fill_ratio": 0.48}
+
+class Counting(FitnessBackend):
+    def __init__(self):
+        self.prepared = []
+
+    def prepare(self, parameters, instance_id, shared_arena = True):
+        self.prepared.append(parameters["seed"])
+
+    def evaluate(self, parameters, instance_id):
+        return float(parameters["seed"])
+
+def test_default_batch_prepares_and_evaluates_one_by_one():
+    backend = Counting()
+    runs = [RUN | {"seed": seed} for seed in range(3)]
+    assert backend.evaluate_batch(runs, 0) == [0.0, 1.0, 2.0]
+    assert backend.prepared == [0, 1, 2]
+    # a run that prepare skips is not evaluated
+    assert backend.evaluate_batch(runs, 0, lambda run: run["seed"] != 1) == [0.0, None, 2.0]
+
+def test_surrogate_simulates_a_batch_side_by_side():
+    backend = SurrogateBackend(seed=1)
+    runs = [RUN | {"seed": seed} for seed in range(20)]
+    answers = backend.evaluate_batch(runs, 0, lambda run: run["seed"] % 5 != 0)
+    assert len(answers) == 20
+    assert [answer is None for answer in answers] == [seed % 5 == 0 for seed in range(20)]
+    assert all(0 < answer <= SurrogateBackend.max_time for answer in answers if answer is not None)
+
+def test_webots_backend_writes_every_file_into_its_project(tmp_path):
+    for directory in ("worlds", "controllers/bayesV2", "world_generation"):
+        (tmp_path / directory).mkdir(parents=True)
+    backend = WebotsBackend(project=str(tmp_path))
+    backend.prepare(RUN | {"seed": 3}, 0)
+    assert (tmp_path / "worlds" / backend.worlds[0]).exists()
+    assert (tmp_path / "controllers" / "bayesV2" / "world.txt").exists()
+    assert (tmp_path / "controllers" / "bayesV2" / "parameters_0.json").exists()
+
+def test_surrogate_observes_every_tile_of_a_non_square_arena():
+    backend = SurrogateBackend(seed=2)
+    backend.simulate([RUN], arenas=[backend.create_bitmap(0.48, shape=(8, 4))])
+    # 8 tiles along y, only the upper 5 rows are white, so a robot that only sees y < 4 decides black
+    arena = np.zeros((4, 8), dtype=np.int8)
+    arena[:, 3:] = 1
+    answers = backend.simulate([RUN] * 10, arenas=[arena] * 10)
+    assert np.mean(answers) < SurrogateBackend.max_time / 2
@@ -0,0 +1,32 @@
+from cache import ResultCache
+
+POSITION = {"rw_mean": 3000, "rw_variance": 1000, "tao": 1500, "u_plus": 0, "p_c": 0.95, "fill_ratio": 0.48}
+
+def test_nearly_identical_position_and_same_seed_hit():
+    cache = ResultCache()
+    cache.put(POSITION, 3, 12.5)
+    assert cache.get(POSITION | {"rw_mean": 3010}, 3) == 12.5
+    # another seed is another world, another grid point is another position
+    assert cache.get(POSITION, 4) is None
+    assert cache.get(POSITION | {"rw_mean": 3100}, 3) is None
+    assert cache.get_statistics()["hits"] == 1
+
+def test_evicted_answers_are_hit_from_the_spill_file(tmp_path):
+    cache = ResultCache(capacity=1, spill_path=str(tmp_path / "spill"))
+    cache.put(POSITION, 0, 1.0)
+    cache.put(POSITION, 1, 2.0)
+    assert cache.get(POSITION, 0) == 1.0
+    assert cache.nr_evictions >= 1 and cache.nr_spill_hits == 1
+    cache.close()
+
+def test_pso_answers_cached_runs_without_leasing_them():
+    from PSO import PSO
+    cache = ResultCache()
+    pso = PSO(nr_particles=2, max_generations=1, cache=cache, seed=0)
+    position = pso.particles[0].pos.get_values()
+    for run_id in range(len(pso.particles[0].runs)):
+        cache.put(position, pso.run_seed(run_id), 1.0)
+
+    # the particles start at the same position, so every run of generation 0 is answered from the cache
+    assert pso.receive_random_particle("client") is None
+    assert pso.is_completed()
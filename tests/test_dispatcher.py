@@ -0,0 +1,80 @@
+from dispatcher import Dispatcher
+
+def always_open(key):
+    return True
+
+def test_runs_are_leased_in_order_once():
+    dispatcher = Dispatcher(lease_duration=10)
+    for run_id in range(3):
+        dispatcher.add((0, 0, run_id))
+
+    keys = [dispatcher.acquire("a", always_open, now=0).key for _ in range(3)]
+    assert keys == [(0, 0, 0), (0, 0, 1), (0, 0, 2)]
+    assert dispatcher.acquire("a", always_open, now=0) is None
+    assert dispatcher.nr_leased() == 3
+
+def test_solved_runs_are_skipped():
+    dispatcher = Dispatcher(lease_duration=10)
+    dispatcher.add((0, 0, 0))
+    dispatcher.add((0, 0, 1))
+
+    lease = dispatcher.acquire("a", lambda key: key != (0, 0, 0), now=0)
+    assert lease.key == (0, 0, 1)
+
+def test_expired_leases_are_handed_out_again():
+    dispatcher = Dispatcher(lease_duration=10)
+    dispatcher.add((0, 0, 0))
+    dispatcher.add((0, 0, 1))
+    first = dispatcher.acquire("a", always_open, now=0)
+    dispatcher.acquire("a", always_open, now=5)
+
+    assert dispatcher.next_deadline() == 10
+    # the expired run goes to the front of the queue
+    lease = dispatcher.acquire("b", always_open, now=10)
+    assert lease.key == first.key and lease.holder == "b"
+    assert dispatcher.nr_leased() == 2
+
+def test_released_leases_do_not_expire():
+    dispatcher = Dispatcher(lease_duration=10)
+    dispatcher.add((0, 0, 0))
+    lease = dispatcher.acquire("a", always_open, now=0)
+    assert dispatcher.release(lease.key, "a") is lease
+
+    dispatcher.reclaim_expired(now=20)
+    assert dispatcher.acquire("b", always_open, now=20) is None
+    assert dispatcher.nr_leased() == 0
+
+def test_straggler_is_leased_to_a_second_holder_once():
+    dispatcher = Dispatcher(lease_duration=100)
+    for run_id in range(3):
+        dispatcher.add((0, 0, run_id))
+    for now in range(3):
+        dispatcher.acquire("a", always_open, now=now)
+
+    # only the first two leases are older than the threshold, and a holder never gets a copy of its own run
+    assert dispatcher.speculate("a", always_open, threshold=10, now=11) is None
+    assert dispatcher.speculate("b", always_open, threshold=10, now=11).key == (0, 0, 0)
+    assert dispatcher.speculate("c", always_open, threshold=10, now=11).key == (0, 0, 1)
+    assert dispatcher.speculate("c", always_open, threshold=10, now=11) is None
+    assert dispatcher.speculate("c", always_open, threshold=10, now=20).key == (0, 0, 2)
+
+def test_first_answer_wins_and_the_other_holder_aborts():
+    dispatcher = Dispatcher(lease_duration=100)
+    dispatcher.add((0, 0, 0))
+    dispatcher.acquire("a", always_open, now=0)
+    dispatcher.speculate("b", always_open, threshold=10, now=20)
+
+    assert dispatcher.release((0, 0, 0), "b").holder == "b"
+    assert dispatcher.pop_cancelled("a") == [(0, 0, 0)]
+    assert dispatcher.pop_cancelled("a") == []
+    assert dispatcher.pop_cancelled("b") == []
+
+def test_speculation_skips_runs_that_were_answered():
+    dispatcher = Dispatcher(lease_duration=100)
+    for run_id in range(2):
+        dispatcher.add((0, 0, run_id))
+        dispatcher.acquire("a", always_open, now=0)
+    dispatcher.release((0, 0, 0), "a")
+
+    assert dispatcher.speculate("b", always_open, threshold=10, now=20).key == (0, 0, 1)
+    assert len(dispatcher.candidates) == 1
@@ -0,0 +1,10 @@
+import pytest
+import config
+
+def test_migration_needs_an_island_id(tmp_path, monkeypatch):
+    monkeypatch.setenv("PSO_MIGRATION", str(tmp_path))
+    monkeypatch.delenv("PSO_ISLAND", raising=False)
+    with pytest.raises(ValueError):
+        config.settings_from_environment()
+    monkeypatch.setenv("PSO_ISLAND", "a")
+    assert config.settings_from_environment()["island_id"] == "a"
@@ -0,0 +1,31 @@
+import json
+
+from PSO import PSO, Mode
+from journal import Journal, recover
+
+def answer(parameters):
+    return (parameters["rw_mean"] - 3000) ** 2 / 1e6 + parameters["run_id"] * 0.1
+
+def drive(pso, nr_answers):
+    for _ in range(nr_answers):
+        parameters = pso.receive_random_particle("client")
+        if parameters is None:
+            break
+        pso.update_fitness_value(parameters["particle_id"], parameters["generation"], parameters["run_id"], answer(parameters), "client")
+
+def test_recover_gives_the_same_state(tmp_path):
+    for mode in (Mode.SYNC, Mode.ASYNC):
+        directory = tmp_path / mode.name
+        pso = recover(PSO(mode, nr_particles=4, max_generations=5), Journal(str(directory)))
+        # a snapshot in the middle, so recovery replays records on top of it
+        pso.snapshot_every = 23
+        drive(pso, 130)
+        # a lease that is still outstanding at the crash
+        leased = pso.receive_random_particle("straggler")
+        pso.journal.close()
+
+        recovered = recover(PSO(mode, nr_particles=4, max_generations=5), Journal(str(directory)))
+        recovered.journal.close()
+        assert json.dumps(recovered.get_snapshot(), sort_keys=True) == json.dumps(pso.get_snapshot(), sort_keys=True)
+        key = (leased["particle_id"], leased["generation"], leased["run_id"])
+        assert recovered.dispatcher.leases[key].holder == "straggler"
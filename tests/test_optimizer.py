@@ -0,0 +1,55 @@
+import json
+
+import numpy as np
+import pytest
+from optimizer import OPTIMIZERS, create_optimizer
+
+def fitness(optimizer, indices):
+    # a bowl around the middle of the space
+    middle = (optimizer.space.lower + optimizer.space.upper) / 2
+    scale = np.maximum(optimizer.space.upper - optimizer.space.lower, 1e-9)
+    return [float((((optimizer.positions[index] - middle) / scale) ** 2).sum()) for index in indices]
+
+def step(optimizer, indices):
+    values = fitness(optimizer, indices)
+    optimizer.tell(indices, values, [{0: value} for value in values])
+    return optimizer.ask(indices)
+
+@pytest.mark.parametrize("name", OPTIMIZERS)
+def test_tell_and_ask_a_subset_of_the_slots(name):
+    optimizer = create_optimizer(name, 6, seed=1)
+    step(optimizer, range(6))
+    before = optimizer.positions.copy()
+    positions = step(optimizer, [1, 4])
+    assert len(positions) == 2
+    assert positions == optimizer.get_positions([1, 4])
+    untouched = [0, 2, 3, 5]
+    assert np.array_equal(optimizer.positions[untouched], before[untouched])
+    assert np.isfinite(optimizer.best_values[[1, 4]]).all()
+
+@pytest.mark.parametrize("name", OPTIMIZERS)
+def test_snapshot_reproduces_the_next_positions(name):
+    optimizer = create_optimizer(name, 6, seed=2)
+    for indices in (range(6), [0, 3], [5]):
+        step(optimizer, indices)
+    restored = create_optimizer(name, 6, seed=3)
+    restored.restore_snapshot(json.loads(json.dumps(optimizer.get_snapshot())))
+    for indices in ([1, 2], range(6)):
+        assert step(restored, indices) == step(optimizer, indices)
+
+def test_differential_evolution_adopts_a_migrant_as_target():
+    optimizer = create_optimizer("de", 6, seed=4)
+    step(optimizer, range(6))
+    worst = int(np.argmax(optimizer.best_values))
+    migrant = optimizer.get_positions([0])[0]
+    optimizer.adopt(migrant, -1.0, {0: -1.0})
+    assert optimizer.best_values[worst] == -1.0
+    assert optimizer.space.to_dict(optimizer.best_positions[worst]) == migrant
+
+def test_cmaes_ranks_a_migrant_in_the_next_update():
+    optimizer = create_optimizer("cmaes", 6, seed=5)
+    optimizer.tell(range(5), fitness(optimizer, range(5)), [{}] * 5)
+    mean = optimizer.mean.copy()
+    optimizer.adopt(optimizer.get_positions([0])[0], -1.0, {})
+    # the migrant completes the population, so the distribution is updated
+    assert optimizer.told == [] and not np.array_equal(optimizer.mean, mean)
@@ -0,0 +1,51 @@
+import json
+import threading
+
+from client import Client
+from backends import SurrogateBackend
+from outbox import Outbox
+
+ANSWER = {"particle_id": 0, "generation": 0, "run_id": 3, "answer": 1.5, "study_id": None}
+
+class Response():
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+class Server():
+    """ stands in for the connection of the client, answers every submission with status_code """
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.received = []
+        self.called = threading.Event()
+
+    def post(self, url, message, timeout = None):
+        self.received.append(message["results"])
+        self.called.set()
+        return Response(self.status_code)
+
+    @staticmethod
+    def decode(response):
+        return {"accepted": 1, "abort": []}
+
+def read(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+def test_answers_survive_a_failed_send_and_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(Outbox, "backoff", 0.01)
+    client = Client("localhost", "5000", "7", backend=SurrogateBackend(), outbox_dir=str(tmp_path))
+    unavailable = Server(503)
+    outbox = Outbox(client.outbox_path, lambda results: client._Client__send_answers(results, unavailable))
+    outbox.put(ANSWER)
+    assert unavailable.called.wait(5)
+    assert outbox.pending == [ANSWER]
+    outbox.close(timeout=0.1)
+    assert read(client.outbox_path) == [ANSWER]
+
+    # the next start sends the answers of the previous run first
+    available = Server(200)
+    outbox = Outbox(client.outbox_path, lambda results: client._Client__send_answers(results, available))
+    outbox.close(timeout=5)
+    assert available.received == [[ANSWER]]
+    assert len(outbox) == 0 and read(client.outbox_path) == []
+    assert client.answers_sent.is_set()
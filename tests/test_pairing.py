@@ -0,0 +1,28 @@
+import pairing
+from PSO import PSO
+from particle import Particle
+from racing import RacingPolicy
+
+POSITION = {"rw_mean": 3000, "rw_variance": 1000, "tao": 1500, "u_plus": 0, "p_c": 0.95, "fill_ratio": 0.48}
+
+def test_differences_only_cover_common_runs():
+    assert pairing.differences({0: 3.0, 1: 5.0, 2: 4.0}, {0: 1.0, 2: 6.0, 7: 0.0}) == [2.0, -2.0]
+
+def test_is_better_compares_paired_runs_before_means():
+    # a higher mean, but better on every run that both have answered
+    assert pairing.is_better({0: 1.0, 1: 2.0, 2: 9.0}, 4.0, {0: 1.5, 1: 2.5}, 2.0)
+    # without common runs the means decide
+    assert not pairing.is_better({3: 1.0}, 4.0, {0: 1.5}, 2.0)
+
+def test_run_seed_is_shared_by_all_particles():
+    pso = PSO(nr_particles=3, max_generations=1, seed=100)
+    seeds = {}
+    while (parameters := pso.receive_random_particle("client", speculate=False)) is not None:
+        assert seeds.setdefault(parameters["run_id"], parameters["seed"]) == parameters["seed"]
+    assert seeds == {run_id: 100 + run_id for run_id in range(Particle.nr_runs)}
+
+def test_racing_without_global_best_answers():
+    particle = Particle(0, POSITION)
+    particle.plan_runs(1)
+    assert particle.update_fit_value(2.0, 0, "client", RacingPolicy(min_runs=5))
+    assert particle.current_fitness == 2.0
@@ -0,0 +1,19 @@
+import json
+
+from PSO import PSO, Mode
+from prescreening import Prescreening
+from test_journal import drive
+
+def create_pso():
+    return PSO(Mode.ASYNC, nr_particles=4, max_generations=5, prescreening=Prescreening(min_points=3))
+
+def test_snapshot_restores_the_observations_of_the_model():
+    pso = create_pso()
+    drive(pso, 150)
+    assert len(pso.prescreening.model) >= 3 and pso.prescreening.nr_saved_runs > 0
+
+    restored = create_pso()
+    restored.restore_snapshot(json.loads(json.dumps(pso.get_snapshot())))
+    assert restored.prescreening.model.values == pso.prescreening.model.values
+    candidates = [particle.pos.get_values() for particle in pso.particles]
+    assert restored.prescreening.plan(candidates, candidates, 15) == pso.prescreening.plan(candidates, candidates, 15)
@@ -0,0 +1,62 @@
+from PSO import PSO, Mode
+from particle import Particle
+from racing import Decision, RacingPolicy
+
+POSITION = {"rw_mean": 3000, "rw_variance": 1000, "tao": 1500, "u_plus": 0, "p_c": 0.95, "fill_ratio": 0.48}
+
+def test_clearly_worse_particle_is_stopped():
+    racing = RacingPolicy(min_runs=5)
+    answers = [10.0, 10.5, 9.5, 10.2, 9.8]
+    assert racing.decide(answers, 15, pb_value=1.0, g_best_value=1.0) == Decision.STOP
+    assert racing.nr_stopped_runs == 10
+
+def test_paired_differences_decide_when_the_answers_overlap():
+    racing = RacingPolicy(min_runs=5)
+    answers = [1.0, 5.0, 9.0, 3.0, 7.0]
+    # every run is 1 worse than the same run of the personal best
+    differences = [1.0, 1.1, 0.9, 1.0, 1.05]
+    assert racing.decide(answers, 15, pb_value=4.0, g_best_value=4.0) == Decision.CONTINUE
+    assert racing.decide(answers, 15, 4.0, 4.0, pb_differences=differences) == Decision.STOP
+
+def test_close_contender_gets_a_batch_of_extra_runs():
+    racing = RacingPolicy(min_runs=5, max_runs=25, budget=7, batch_size=5)
+    particle = Particle(0, POSITION)
+    particle.plan_runs(5)
+    answers = [4.0, 6.0, 5.0, 4.5, 5.5]
+    for run_id, answer in enumerate(answers):
+        assert not particle.update_fit_value(answer, run_id, "client", racing, g_best_value=5.0)
+    assert len(particle.runs) == 10
+    assert racing.nr_extra_runs == 5
+    # only 2 runs of the budget are left
+    assert racing.extend(10) == 2
+    assert racing.extend(12) == 0
+
+def test_budget_survives_a_snapshot():
+    racing = RacingPolicy(budget=30)
+    racing.extend(5)
+    restored = RacingPolicy(budget=30)
+    restored.restore_snapshot(racing.get_snapshot())
+    assert restored.nr_extra_runs == 5
+    restored.new_generation()
+    assert restored.nr_extra_runs == 0
+
+def test_particle_is_compared_with_the_best_of_its_slot():
+    racing = RacingPolicy(min_runs=5)
+    particle = Particle(0, POSITION)
+    # the optimizer's best of the slot answered every run 1 better
+    pb_answers = {run_id: float(run_id) for run_id in range(15)}
+    completed = [particle.update_fit_value(run_id + 1.0 + 0.01 * (run_id % 2), run_id, "client", racing, 100.0, {}, 7.0, pb_answers) for run_id in range(5)]
+    assert completed == [False] * 4 + [True]
+
+def test_stopped_particle_revokes_its_outstanding_leases():
+    pso = PSO(Mode.ASYNC, racing=RacingPolicy(min_runs=5), nr_particles=2, max_generations=3)
+    leases = [pso.receive_random_particle("a" if i < 5 else "b", speculate=False) for i in range(Particle.nr_runs)]
+    assert {lease["particle_id"] for lease in leases} == {0}
+    # the slot of the particle already knows a much better position
+    pso.optimizer.best_values[0] = pso.g_best_value = 1.0
+    for run_id, answer in enumerate([10.0, 10.5, 9.5, 10.2, 9.8]):
+        pso.update_fitness_value(0, 0, run_id, answer, "a")
+    assert pso.generations[0] == 1
+    assert not any(key[0] == 0 and key[1] == 0 for key in pso.dispatcher.leases)
+    assert pso.heartbeat("a") == []
+    assert sorted(run["run_id"] for run in pso.heartbeat("b")) == list(range(5, Particle.nr_runs))
@@ -0,0 +1,36 @@
+import pytest
+from PSO import Mode
+from config import create_pso
+from results import ResultStore
+from test_journal import drive
+
+def nr_stored(pso):
+    return len(pso.results.query(limit=10 ** 6))
+
+@pytest.mark.parametrize("chunk_size, clean_exit", [(4096, False), (4096, True), (126, False)])
+def test_restart_stores_every_answer_once(tmp_path, chunk_size, clean_exit):
+    settings = {"mode": Mode.SYNC, "journal_dir": str(tmp_path / "journal"), "results_dir": str(tmp_path / "results"), "nr_particles": 4, "max_generations": 5}
+    pso = create_pso(**settings)
+    pso.results.chunk_size = chunk_size
+    pso.snapshot_every = 23
+    drive(pso, 130)
+    pso.journal.close()
+    # the snapshots keep the buffered results, only full chunks are written
+    assert len(pso.results.chunks) == 130 // chunk_size
+    if clean_exit:
+        # the buffer is flushed at exit, after a crash it is lost
+        pso.results.flush()
+
+    recovered = create_pso(**settings)
+    recovered.journal.close()
+    assert nr_stored(recovered) == 130
+    recovered.results.flush()
+    assert sorted(row["answer"] for row in recovered.results.query(limit=10 ** 6)) == sorted(row["answer"] for row in pso.results.query(limit=10 ** 6))
+
+def test_invalid_query_parameters_are_rejected(tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.append({"particle_id": 0, "generation": 0, "run_id": 0, "answer": 1.0, "client": "a"})
+    assert len(store.query({"generation": "0"})) == 1
+    for filters, limit in (({}, 0), ({}, "10"), ({"generation": "first"}, 10), ({"min_client": "a"}, 10)):
+        with pytest.raises(ValueError):
+            store.query(filters, limit=limit)
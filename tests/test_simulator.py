@@ -0,0 +1,26 @@
+import sys
+
+import pytest
+from backends import PersistentBackend, create_backend
+from simulator import SimulatorError, SimulatorProcess
+
+PARAMETERS = {"rw_mean": 3000, "rw_variance": 1000, "tao": 1500, "u_plus": 0, "p_c": 0.95, "fill_ratio": 0.48, "seed": 3}
+
+def test_stub_simulator_answers_without_the_webots_project(monkeypatch):
+    monkeypatch.delenv("PSO_SIMULATOR", raising=False)
+    backend = create_backend("persistent")
+    assert isinstance(backend, PersistentBackend) and isinstance(backend.command, list)
+    # prepare does not write into the (missing) webots project
+    backend.prepare(PARAMETERS, 0)
+    try:
+        first = backend.evaluate(PARAMETERS, 0)
+        assert first is not None and first == backend.evaluate(PARAMETERS, 0)
+    finally:
+        backend.simulators[0].close()
+
+def test_hanging_simulator_is_killed():
+    # reads the request but never answers
+    simulator = SimulatorProcess([sys.executable, "-c", "import sys; sys.stdin.readline(); sys.stdin.read()"], timeout=0.5)
+    with pytest.raises(SimulatorError):
+        simulator.evaluate({"world": None, "parameters": {}})
+    assert simulator.process.wait(timeout=5) is not None
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from PSO import PSO
+from study import Study, StudyScheduler
+import config
+
+def test_runs_are_shared_by_weight():
+    heavy = Study("heavy", PSO(nr_particles=5, max_generations=2), weight=3)
+    light = Study("light", PSO(nr_particles=5, max_generations=2), weight=1)
+    scheduler = StudyScheduler([heavy, light])
+
+    served = [scheduler.receive_random_particle("client")["study_id"] for _ in range(40)]
+    assert served.count("heavy") == 30
+    assert served.count("light") == 10
+
+def test_study_without_open_runs_gives_way():
+    waiting = Study("waiting", PSO(nr_particles=1, max_generations=2), weight=100)
+    other = Study("other", PSO(nr_particles=5, max_generations=2), weight=1)
+    scheduler = StudyScheduler([waiting, other])
+    # lease every run of the first generation of the heavy study, it now waits at its generation barrier
+    while waiting.pso.receive_random_particle("client", speculate=False) is not None:
+        pass
+
+    assert scheduler.receive_random_particle("client")["study_id"] == "other"
+
+@pytest.mark.parametrize("weight", [0, -1, "2"])
+def test_weights_must_be_positive(monkeypatch, weight):
+    monkeypatch.setenv("PSO_STUDIES", json.dumps([{"id": "a", "weight": weight}]))
+    with pytest.raises(ValueError):
+        config.studies_from_environment()